@@ -0,0 +1,106 @@
+import argparse
+import csv
+import glob
+import os
+import cv2
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import *
+from video_processor import VideoProcessor
+from roi_manager import ROIManager
+from signal_processor import SignalProcessor
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+# One FaceMesh per worker process, created by the pool initializer
+_face_mesh = None
+
+def _init_worker():
+    global _face_mesh
+    _face_mesh = VideoProcessor().create_face_mesh()
+
+def collect_videos(inputs):
+    paths = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for name in sorted(os.listdir(pattern)):
+                if name.lower().endswith(VIDEO_EXTENSIONS):
+                    paths.append(os.path.join(pattern, name))
+        else:
+            paths.extend(sorted(glob.glob(pattern)))
+    return list(dict.fromkeys(paths))
+
+def output_paths(paths, output_dir):
+    # CSV path per input, mirroring its location under the inputs' common
+    # directory so a/clip.mp4 and b/clip.mp4 do not overwrite each other;
+    # the extension is kept only where names would still clash (clip.mp4, clip.avi)
+    paths = [os.path.abspath(path) for path in paths]
+    root = os.path.commonpath([os.path.dirname(path) for path in paths])
+    relative = [os.path.relpath(path, root) for path in paths]
+    stems = [os.path.splitext(name)[0] for name in relative]
+    counts = Counter(stems)
+    return [os.path.join(output_dir, (stem if counts[stem] == 1 else name) + '.csv')
+            for stem, name in zip(stems, relative)]
+
+def process_video(path, output_path):
+    video_processor = VideoProcessor()
+    video_processor.open_source(path)
+    _face_mesh.reset()
+    video_processor.face_mesh = _face_mesh
+    roi_manager = ROIManager()
+    signal_processor = SignalProcessor()
+
+    rows = []
+    while True:
+        ret, frame = video_processor.cap.read()
+        if not ret:
+            break
+        # Container time, so the file is processed as fast as frames decode
+        timestamp = video_processor.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+
+        frame, face_rects = video_processor.detect_faces(frame)
+        for face_rect, landmarks in zip(face_rects, video_processor.face_landmarks):
+            current_rois, intensities = video_processor.extract_signals(frame, face_rect, roi_manager,
+                                                                       draw=False, landmarks=landmarks)
+            motion = video_processor.motion.update(landmarks, face_rect, timestamp)
+            video_processor.update_signals(signal_processor, None, current_rois, intensities, timestamp, motion)
+            rows.append((timestamp, signal_processor.current_bpm, signal_processor.avg_snr, signal_processor.confidence))
+
+    video_processor.release()
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['time', 'bpm', 'snr', 'confidence'])
+        for timestamp, bpm, snr, confidence in rows:
+            writer.writerow([f"{timestamp:.3f}", f"{bpm:.2f}", f"{snr:.2f}", f"{confidence:.1f}"])
+
+    return output_path, len(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline heart rate extraction from recorded videos")
+    parser.add_argument('inputs', nargs='+', help="video files, directories or glob patterns")
+    parser.add_argument('--output', default='batch_results', help="directory for the per-file CSV time series")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="number of worker processes")
+    args = parser.parse_args()
+
+    paths = collect_videos(args.inputs)
+    if not paths:
+        print("No video files found.")
+        return
+    os.makedirs(args.output, exist_ok=True)
+
+    print(f"Processing {len(paths)} file(s) with {args.workers} worker(s)")
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as executor:
+        futures = {executor.submit(process_video, path, output_path): path
+                   for path, output_path in zip(paths, output_paths(paths, args.output))}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                output_path, n_samples = future.result()
+                print(f"{path}: {n_samples} samples -> {output_path}")
+            except Exception as e:
+                print(f"{path}: {e}")
+
+if __name__ == "__main__":
+    main()
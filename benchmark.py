@@ -0,0 +1,319 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+import cv2
+import numpy as np
+import config
+from config import *
+from video_processor import VideoProcessor
+from roi_manager import ROIManager
+from signal_processor import SignalProcessor
+from visualization import Visualization
+
+SKIN_BGR = (120, 150, 200)
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in a fresh interpreter: cold import of the app, FaceMesh load (with the
+# MediaPipe import), first inference, then the first BPM estimate (2 s of
+# samples through replay) including the SciPy import that live capture
+# overlaps with its first frames. Prints one JSON line.
+STARTUP_SCRIPT = '''
+import json, time
+start = time.perf_counter()
+marks = {}
+import main
+marks['import_s'] = time.perf_counter() - start
+
+import numpy as np
+from video_processor import VideoProcessor
+from signal_processor import SignalProcessor
+from session_recorder import record_intensities, replay_samples
+from benchmark import draw_face, pulse_waveform
+
+signal_processor = SignalProcessor()
+t = time.perf_counter()
+face_mesh = VideoProcessor().create_face_mesh()
+marks['face_mesh_load_s'] = time.perf_counter() - t
+
+frame, _ = draw_face()
+t = time.perf_counter()
+face_mesh.process(frame[:, :, ::-1].copy())
+marks['first_inference_s'] = time.perf_counter() - t
+marks['first_frame_s'] = time.perf_counter() - start
+
+times = np.arange(60) / 30.0
+means = np.full((60, 1, 3), 128.0)
+means[:, 0, 1] += pulse_waveform(times, 72)
+rois = [{'name': 'forehead', 'type': 'rect', 'weight': 1.0, 'color': (0, 255, 0)}]
+t = time.perf_counter()
+replay_samples(times, record_intensities(means), np.ones(60, bool), rois, signal_processor)
+marks['first_estimate_s'] = time.perf_counter() - t
+print(json.dumps(marks))
+'''
+
+def draw_face(width=CAMERA_WIDTH, height=CAMERA_HEIGHT, scale=1.0):
+    # Cartoon face that FaceMesh reliably detects, plus a mask of its skin
+    cx, cy, s = width // 2, height // 2, scale
+    frame = np.full((height, width, 3), (70, 80, 90), dtype=np.uint8)
+    skin = np.zeros((height, width), dtype=np.uint8)
+
+    cv2.rectangle(skin, (int(cx - 45 * s), int(cy + 100 * s)), (int(cx + 45 * s), height), 255, -1)
+    cv2.ellipse(frame, (cx, int(cy - 30 * s)), (int(115 * s), int(120 * s)), 0, 180, 360, (40, 50, 60), -1)
+    cv2.ellipse(skin, (cx, cy), (int(100 * s), int(135 * s)), 0, 0, 360, 255, -1)
+    frame[skin > 0] = SKIN_BGR
+
+    for dx in (-40, 40):
+        ex, ey = int(cx + dx * s), int(cy - 25 * s)
+        cv2.ellipse(frame, (ex, ey), (int(22 * s), int(11 * s)), 0, 0, 360, (240, 240, 240), -1)
+        cv2.circle(frame, (ex, ey), int(8 * s), (60, 40, 30), -1)
+        cv2.circle(frame, (ex, ey), int(4 * s), (10, 10, 10), -1)
+        cv2.ellipse(frame, (ex, int(ey - 22 * s)), (int(26 * s), int(7 * s)), 0, 180, 360, (40, 50, 60), -1)
+        cv2.ellipse(skin, (ex, ey), (int(26 * s), int(30 * s)), 0, 0, 360, 0, -1)
+
+    nose = np.array([[cx, cy - 15 * s], [cx - 14 * s, cy + 35 * s], [cx + 14 * s, cy + 35 * s]], dtype=np.int32)
+    cv2.fillPoly(frame, [nose], (100, 125, 175))
+    cv2.ellipse(frame, (cx, int(cy + 70 * s)), (int(35 * s), int(12 * s)), 0, 0, 360, (80, 80, 170), -1)
+    cv2.line(frame, (int(cx - 35 * s), int(cy + 70 * s)), (int(cx + 35 * s), int(cy + 70 * s)), (40, 40, 90), 2)
+    cv2.ellipse(skin, (cx, int(cy + 70 * s)), (int(40 * s), int(16 * s)), 0, 0, 360, 0, -1)
+
+    return cv2.GaussianBlur(frame, (5, 5), 0), skin
+
+def pulse_waveform(t, bpm):
+    # Fundamental plus a weaker second harmonic, roughly PPG shaped
+    phase = 2 * np.pi * bpm / 60.0 * t
+    return np.sin(phase) + 0.3 * np.sin(2 * phase + 0.5)
+
+def synthetic_frames(duration=20, fps=30, bpm=72, amplitude=2.0, noise=2.0, motion=0.0, jitter=0.0, seed=0,
+                     burst=None):
+    # Yields (frame, timestamp, true_bpm). The pulse modulates the green channel
+    # of skin pixels; motion is a slow sway in pixels; jitter is the standard
+    # deviation of the capture-time error in seconds; burst is a (start, end)
+    # interval in seconds of fast head shaking with the shading it brings.
+    # Illumination follows the face, so the shading swamps the pulse.
+    rng = np.random.default_rng(seed)
+    base, skin = draw_face()
+    base = base.astype(np.float32)
+    skin = (skin > 0).astype(np.float32)
+    height, width = skin.shape
+
+    n_frames = int(duration * fps)
+    timestamps = np.arange(n_frames) / fps + rng.normal(0, jitter, n_frames)
+    timestamps = np.maximum.accumulate(np.clip(timestamps, 0, None))
+
+    for i, t in enumerate(timestamps):
+        frame = base.copy()
+        frame[:, :, 1] += amplitude * pulse_waveform(i / fps, bpm) * skin
+        shaking = burst is not None and burst[0] <= t < burst[1]
+        if shaking:
+            frame *= 1.0 + 0.04 * np.sin(2 * np.pi * 1.7 * t)
+        frame += rng.normal(0, noise, (height, width, 1)).astype(np.float32)
+        frame = np.clip(frame, 0, 255).astype(np.uint8)
+
+        dx = motion * np.sin(2 * np.pi * 0.25 * t)
+        dy = 0.5 * motion * np.sin(2 * np.pi * 0.15 * t)
+        if shaking:
+            dx += 25 * np.sin(2 * np.pi * 1.7 * t)
+        if dx or dy:
+            shift = np.float32([[1, 0, dx], [0, 1, dy]])
+            frame = cv2.warpAffine(frame, shift, (width, height), borderMode=cv2.BORDER_REPLICATE)
+
+        yield frame, 1000.0 + t, bpm
+
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+
+    def wrap(self, name, func):
+        samples = self.samples.setdefault(name, [])
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            samples.append(time.perf_counter() - start)
+            return result
+        return timed
+
+    def record(self, name, seconds):
+        self.samples.setdefault(name, []).append(seconds)
+
+    def summary(self):
+        report = {}
+        for name, samples in self.samples.items():
+            if not samples:
+                continue
+            ms = np.array(samples) * 1000.0
+            report[name] = {
+                'calls': len(ms),
+                'mean_ms': float(np.mean(ms)),
+                'p50_ms': float(np.percentile(ms, 50)),
+                'p99_ms': float(np.percentile(ms, 99)),
+                'per_sec': float(1000.0 / np.mean(ms)) if np.mean(ms) > 0 else None
+            }
+        return report
+
+class _TimedFaceMesh:
+    def __init__(self, face_mesh, timer):
+        self.face_mesh = face_mesh
+        self.process = timer.wrap('face_mesh.process', face_mesh.process)
+
+def run_benchmark(duration=20, fps=30, bpm=72, amplitude=2.0, noise=2.0, motion=0.0, jitter=0.0,
+                  seed=0, render=True, trace_memory=False, burst=None):
+    timer = StageTimer()
+    video_processor = VideoProcessor()
+    roi_manager = ROIManager()
+    signal_processor = SignalProcessor()
+    visualization = Visualization()
+
+    face_mesh = video_processor.create_face_mesh()
+    video_processor.face_mesh = _TimedFaceMesh(face_mesh, timer)
+    roi_manager.extract_roi_signals = timer.wrap('extract_roi_signals', roi_manager.extract_roi_signals)
+    roi_manager.extract_polygon_signals = timer.wrap('extract_polygon_signals', roi_manager.extract_polygon_signals)
+    signal_processor.calculate_heart_rate = timer.wrap('calculate_heart_rate', signal_processor.calculate_heart_rate)
+    visualization.create_display_frame = timer.wrap('create_display_frame', visualization.create_display_frame)
+
+    errors = []
+    estimate_times = []
+    first_estimate = None
+    faces_found = 0
+    n_frames = 0
+
+    if trace_memory:
+        # Python/NumPy allocations only, and it slows every allocation down
+        tracemalloc.start()
+    wall_start = time.perf_counter()
+    for frame, timestamp, true_bpm in synthetic_frames(duration, fps, bpm, amplitude, noise, motion, jitter, seed,
+                                                       burst):
+        frame_start = time.perf_counter()
+        processed_frame, current_rois = video_processor.process_frame(
+            frame, roi_manager, signal_processor, visualization, timestamp
+        )
+        if render:
+            visualization.create_display_frame(processed_frame, signal_processor, current_rois, video_processor)
+        timer.record('frame', time.perf_counter() - frame_start)
+
+        n_frames += 1
+        faces_found += bool(current_rois)
+        if signal_processor.current_bpm > 0:
+            if first_estimate is None:
+                first_estimate = timestamp - 1000.0
+            errors.append(abs(signal_processor.current_bpm - true_bpm))
+            estimate_times.append(timestamp - 1000.0)
+    wall_time = time.perf_counter() - wall_start
+    peak_traced = None
+    if trace_memory:
+        peak_traced = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    face_mesh.close()
+
+    errors = np.array(errors)
+    estimate_times = np.array(estimate_times)
+    burst_error = recovery = None
+    if burst is not None and len(errors):
+        # Worst error from the burst on, and how long after it ends the
+        # estimate is back within 5 BPM for good
+        after = estimate_times >= burst[0]
+        if after.any():
+            burst_error = float(np.max(errors[after]))
+            bad = np.flatnonzero(after & (errors > 5))
+            recovery = max(0.0, float(estimate_times[bad[-1]] - burst[1] + 1.0 / fps)) if len(bad) else 0.0
+    return {
+        'params': {
+            'duration': duration, 'fps': fps, 'bpm': bpm, 'amplitude': amplitude, 'noise': noise,
+            'motion': motion, 'jitter': jitter, 'seed': seed, 'render': render, 'trace_memory': trace_memory,
+            'burst': burst
+        },
+        'config': {name: getattr(config, name) for name in dir(config)
+                   if name.isupper() and isinstance(getattr(config, name), (int, float, str, bool, type(None)))},
+        'throughput_fps': n_frames / wall_time,
+        'face_detection_rate': faces_found / max(1, n_frames),
+        'stages': timer.summary(),
+        'governor': video_processor.governor.state() if video_processor.governor is not None else None,
+        'memory': {
+            'traced_peak_mb': peak_traced,
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+        },
+        'accuracy': {
+            'time_to_first_bpm_s': first_estimate,
+            'mae_bpm': float(np.mean(errors)) if len(errors) else None,
+            'final_error_bpm': float(errors[-1]) if len(errors) else None,
+            'burst_max_error_bpm': burst_error,
+            'burst_recovery_s': recovery
+        }
+    }
+
+def run_startup_benchmark(runs=5):
+    # Median over `runs` fresh interpreters, so every run is a cold start;
+    # process_s also includes interpreter startup and shutdown
+    results = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], cwd=PROJECT_DIR,
+                                capture_output=True, text=True, check=True).stdout
+        marks = json.loads(output.strip().splitlines()[-1])
+        marks['process_s'] = time.perf_counter() - start
+        results.append(marks)
+    return {
+        'runs': runs,
+        'startup': {name: float(np.median([marks[name] for marks in results])) for name in results[0]}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and accuracy benchmark on synthetic rPPG video")
+    parser.add_argument('--duration', type=float, default=20, help="seconds of synthetic video")
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--bpm', type=float, default=72, help="ground-truth heart rate")
+    parser.add_argument('--amplitude', type=float, default=2.0, help="pulse amplitude in green levels")
+    parser.add_argument('--noise', type=float, default=2.0, help="per-pixel sensor noise std")
+    parser.add_argument('--motion', type=float, default=0.0, help="head sway amplitude in pixels")
+    parser.add_argument('--jitter', type=float, default=0.0, help="capture timestamp jitter std in seconds")
+    parser.add_argument('--burst', metavar='START:END', help="seconds of fast head shaking, e.g. 12:14")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-render', action='store_true', help="skip create_display_frame")
+    parser.add_argument('--trace-memory', action='store_true', help="also track peak Python/NumPy allocations")
+    parser.add_argument('--startup', action='store_true', help="measure cold-start times instead of throughput")
+    parser.add_argument('--runs', type=int, default=5, help="fresh processes for --startup")
+    parser.add_argument('--output', default='benchmark.json', help="where to write the JSON report")
+    args = parser.parse_args()
+
+    if args.startup:
+        report = run_startup_benchmark(args.runs)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Cold start, median of {args.runs} runs:")
+        for name, seconds in report['startup'].items():
+            print(f"  {name:24s} {seconds * 1000:8.1f} ms")
+        print(f"Report written to {args.output}")
+        return
+
+    burst = tuple(float(value) for value in args.burst.split(':')) if args.burst else None
+    report = run_benchmark(args.duration, args.fps, args.bpm, args.amplitude, args.noise, args.motion,
+                           args.jitter, args.seed, render=not args.no_render, trace_memory=args.trace_memory,
+                           burst=burst)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Throughput: {report['throughput_fps']:.1f} frames/s "
+          f"(face found in {report['face_detection_rate'] * 100:.0f}% of frames)")
+    for name, stats in report['stages'].items():
+        print(f"  {name:24s} p50 {stats['p50_ms']:7.2f} ms   p99 {stats['p99_ms']:7.2f} ms   ({stats['calls']} calls)")
+    memory = report['memory']
+    traced = f", {memory['traced_peak_mb']:.1f} MB traced" if memory['traced_peak_mb'] is not None else ""
+    print(f"Peak memory: {memory['max_rss_mb']:.0f} MB RSS{traced}")
+    accuracy = report['accuracy']
+    if accuracy['mae_bpm'] is not None:
+        print(f"BPM error: MAE {accuracy['mae_bpm']:.2f}, final {accuracy['final_error_bpm']:.2f}, "
+              f"first estimate after {accuracy['time_to_first_bpm_s']:.1f} s")
+        if accuracy['burst_recovery_s'] is not None:
+            print(f"Motion burst: worst error {accuracy['burst_max_error_bpm']:.1f} BPM, "
+                  f"back within 5 BPM {accuracy['burst_recovery_s']:.1f} s after it ended")
+    else:
+        print("BPM error: no estimate produced")
+    print(f"Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,198 @@
-import mediapipe as mp
-
-# MediaPipe initialization
-mp_face_mesh = mp.solutions.face_mesh
-mp_drawing = mp.solutions.drawing_utils
-drawing_spec = mp_drawing.DrawingSpec(thickness=1, circle_radius=1)
+def __getattr__(name):
+    # MediaPipe handles, created on first use: importing mediapipe costs most
+    # of a second (it loads every solution and matplotlib), which tools that
+    # never run FaceMesh should not pay
+    if name in ('mp_face_mesh', 'mp_drawing', 'drawing_spec'):
+        import mediapipe as mp
+        handles = {
+            'mp_face_mesh': mp.solutions.face_mesh,
+            'mp_drawing': mp.solutions.drawing_utils,
+            'drawing_spec': mp.solutions.drawing_utils.DrawingSpec(thickness=1, circle_radius=1)
+        }
+        globals().update(handles)
+        return handles[name]
+    raise AttributeError(f"module 'config' has no attribute '{name}'")
 
 # Signal processing parameters
 BUFFER_DURATION = 15
+BUFFER_CAPACITY = int(BUFFER_DURATION * 60 * 1.5)  # ring buffer samples, headroom over 60 fps
 UPDATE_INTERVAL = 5
 BANDPASS_LOWCUT = 0.8
 BANDPASS_HIGHCUT = 3.5
 FILTER_ORDER = 4
+# Scheduled BPM updates are skipped below SNR_UPDATE_GATE dB; above
+# PEAK_FUSION_SNR dB the FFT peak is averaged with the peak-interval rate
+SNR_UPDATE_GATE = 2
+PEAK_FUSION_SNR = 3
+
+# Time-domain filtering: 'zero_phase' re-runs sosfiltfilt over the window on
+# every estimate, 'streaming' filters each new sample causally with carried
+# state and redesigns once fs drifts by more than FILTER_FS_TOLERANCE
+FILTER_MODE = 'zero_phase'
+FILTER_FS_TOLERANCE = 0.1
+DISPLAY_ZERO_PHASE = True
+
+# Resample the combined signal onto a uniform grid before filtering and
+# spectral analysis (Hz); None analyses the raw frame timestamps. Gaps longer
+# than RESAMPLE_MAX_GAP grid periods restart the grid instead of being bridged
+RESAMPLE_FS = None
+RESAMPLE_MAX_GAP = 5
+
+# Pulse signal: 'green' combines the green-channel mean of each ROI; 'pos'
+# and 'chrom' keep all three channel means and derive the pulse from skin
+# chrominance over sliding CHROMINANCE_WINDOW second windows, analysing only
+# the last CHROMINANCE_ANALYSIS_DURATION seconds. The chrominance trace is
+# rebuilt on every estimate, so these methods always take the zero-phase FFT
+# path on the raw frame timestamps (zero-padded to SPECTRUM_RESOLUTION)
+SIGNAL_METHOD = 'green'
+CHROMINANCE_WINDOW = 1.6
+CHROMINANCE_ANALYSIS_DURATION = 10
+
+# Spectrum estimation: 'fft' recomputes the whole window every frame,
+# 'welch' updates an overlap-hop Welch average every SPECTRUM_HOP samples
+SPECTRUM_MODE = 'fft'
+SPECTRUM_HOP = 15
+SPECTRUM_SEGMENT_DURATION = 8
+SPECTRUM_RESOLUTION = 1 / 30
 
 # Camera settings
 CAMERA_WIDTH = 640
 CAMERA_HEIGHT = 480
 CAMERA_FPS = 60
 
+# Inference resolution: FaceMesh sees the frame resized by INFERENCE_SCALE
+# (landmarks are mapped back to full resolution), and rectangle ROIs are
+# area-averaged by ROI_POOL_SCALE before skin segmentation. MIRROR_MODE
+# 'frame' flips every captured frame; 'display' processes frames as captured
+# and mirrors only the downsized camera image on screen. FaceMesh resamples
+# internally, so INFERENCE_SCALE mainly pays off above 640x480 capture
+INFERENCE_SCALE = 1.0
+ROI_POOL_SCALE = 1.0
+MIRROR_MODE = 'frame'
+
+# Adaptive frame-rate governor (governor.py). Every GOVERNOR_INTERVAL seconds
+# of video it compares processing time per second of video with
+# GOVERNOR_CPU_BUDGET and the estimate's SNR (dB) and confidence with the
+# good bounds, then steps the spectrum estimate interval (seconds), the
+# frame decimation (never below GOVERNOR_MIN_RATE processed frames/s; a 3.5 Hz
+# band needs about 15-20) or the FaceMesh input scale by one notch
+GOVERNOR_ENABLED = False
+GOVERNOR_CPU_BUDGET = 0.5
+GOVERNOR_INTERVAL = 1.0
+GOVERNOR_MIN_RATE = 20
+GOVERNOR_ESTIMATE_INTERVALS = (0.0, 0.1, 0.25, 0.5)
+GOVERNOR_INFERENCE_SCALES = (1.0, 0.75, 0.5)
+GOVERNOR_SNR_GOOD = 4
+GOVERNOR_CONFIDENCE_GOOD = 60
+GOVERNOR_HEADROOM = 0.7
+
+# Frame pipeline: 'serial' runs every stage in the main loop, 'threaded' runs
+# capture, inference and DSP on their own threads joined by bounded queues
+PIPELINE_MODE = 'serial'
+PIPELINE_QUEUE_SIZE = 2
+PIPELINE_DROP_OLDEST = True
+
+# Run FaceMesh every DETECTION_INTERVAL frames and carry the face box in
+# between with optical flow; a full detection is forced early when the flow
+# error or the per-frame landmark motion (pixels) exceeds the limits
+LANDMARK_TRACKING = False
+DETECTION_INTERVAL = 5
+TRACKING_MAX_ERROR = 12.0
+TRACKING_MAX_MOTION = 8.0
+
+# Motion rejection: the motion index is the median frame-to-frame shift of the
+# rigid tracking landmarks in face widths per second. Above MOTION_THRESHOLD a
+# sample, and any within MOTION_HOLD seconds of one, repeats the last clean ROI
+# values and the run is replaced by a linear interpolation once the head is
+# still again; no estimate is made during a run or while more than
+# MOTION_MAX_FRACTION of the buffer is interpolated
+MOTION_REJECTION = True
+MOTION_THRESHOLD = 0.5
+MOTION_HOLD = 0.3
+MOTION_MAX_FRACTION = 0.3
+
+# Faces monitored per camera. Above 1, faces are matched to subjects across
+# frames by box IoU (falling back to centroid distance) and each subject keeps
+# its own signal state; subjects unseen for SUBJECT_TIMEOUT seconds are dropped.
+# Only main.py's serial loop tracks subjects; every other path follows one face
+MAX_FACES = 1
+SUBJECT_MATCH_IOU = 0.3
+SUBJECT_TIMEOUT = 2.0
+
+# Per-stage timing and counters (see metrics.py). When enabled, METRICS_PORT
+# serves Prometheus text on localhost and METRICS_LOG appends a JSON snapshot
+# every METRICS_LOG_INTERVAL seconds, rotated at METRICS_LOG_MAX_BYTES
+METRICS_ENABLED = False
+METRICS_WINDOW = 512
+METRICS_PORT = None
+METRICS_LOG = None
+METRICS_LOG_INTERVAL = 10
+METRICS_LOG_MAX_BYTES = 10 * 2 ** 20
+METRICS_LOG_BACKUPS = 3
+
+# Headless service (service.py): HTTP/WebSocket stream bound to localhost.
+# Each client buffers at most SERVICE_CLIENT_QUEUE messages, dropping the
+# oldest when it falls behind; results are published every
+# SERVICE_PUBLISH_INTERVAL seconds
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8765
+SERVICE_CLIENT_QUEUE = 8
+SERVICE_PUBLISH_INTERVAL = 0.2
+SERVICE_STREAM_WAVEFORM = False
+
+# Multi-stream host (multistream.py): MULTISTREAM_WORKERS FaceMesh instances
+# in static image mode, shared by every stream, take frames round-robin. A
+# live frame that has waited MULTISTREAM_DEADLINE seconds by its turn is
+# dropped; the DSP for all streams runs every MULTISTREAM_TICK seconds, with
+# one filter/FFT call per group of streams that share a window length and rate
+# (set RESAMPLE_FS so independent cameras do). File sources queue up to
+# MULTISTREAM_QUEUE frames and drop nothing
+MULTISTREAM_WORKERS = 2
+MULTISTREAM_DEADLINE = 0.1
+MULTISTREAM_TICK = 1 / 30
+MULTISTREAM_QUEUE = 4
+
+# Session recording: when RECORDING_DIR is set, main.py writes every frame's
+# face box and per-ROI color statistics (optionally all landmarks) to a new
+# session directory there, in .npy chunks of RECORDING_CHUNK_FRAMES records.
+# session_recorder.py replays a session through the DSP without video.
+# Recording is single-face only and is skipped when MAX_FACES > 1
+RECORDING_DIR = None
+RECORD_LANDMARKS = False
+RECORDING_CHUNK_FRAMES = 18000
+
+# BPM event log: when EVENT_LOG_DIR is set, every BPM update and (with
+# EVENT_LOG_FRAMES) every frame with a face is queued in memory and written
+# by a background thread every EVENT_LOG_FLUSH_INTERVAL seconds, as Parquet
+# if pyarrow is installed or else compressed .npz, one file per flush. A new
+# Parquet file is started after EVENT_LOG_ROTATE_SECONDS or EVENT_LOG_MAX_BYTES;
+# at most EVENT_LOG_MAX_PENDING rows wait, beyond that the oldest are dropped.
+# Each process logs into its own subdirectory. event_log.py summarizes a log
+# directory
+EVENT_LOG_DIR = None
+EVENT_LOG_FRAMES = True
+EVENT_LOG_FLUSH_INTERVAL = 5.0
+EVENT_LOG_ROTATE_SECONDS = 600
+EVENT_LOG_MAX_BYTES = 32 * 2 ** 20
+EVENT_LOG_MAX_PENDING = 100000
+
 # Display settings
 DISPLAY_WIDTH = 1200
 DISPLAY_HEIGHT = 700
 GRAPH_WIDTH = 550
 GRAPH_HEIGHT = 200
+# Seconds between redraws of the status panel and graphs; the camera image
+# is updated every frame (0 redraws everything every frame)
+DISPLAY_REFRESH_INTERVAL = 0.1
+
+# ROI placement: 'rectangle' cuts fixed fractions of the face box and
+# skin-segments them, 'polygon' follows FaceMesh landmark outlines and skips
+# skin segmentation; polygon masks are rasterized at POLYGON_MASK_SCALE
+ROI_MODE = 'rectangle'
+POLYGON_MASK_SCALE = 0.5
+
+# Seconds between ROI quality rescoring (0 rescoring every frame)
+QUALITY_REFRESH_INTERVAL = 0.5
 
 # ROI weights (initial)
 ROI_WEIGHTS = {
@@ -34,4 +205,13 @@ ROI_WEIGHTS = {
 SKIN_LOWER_YCRCB = [0, 133, 77]
 SKIN_UPPER_YCRCB = [255, 173, 127]
 SKIN_LOWER_HSV = [0, 30, 60]
-SKIN_UPPER_HSV = [25, 150, 255]
\ No newline at end of file
+SKIN_UPPER_HSV = [25, 150, 255]
+# SKIN_MODEL 'lut' looks each pixel up in a SKIN_LUT_BINS**3 BGR table built
+# once from the bounds above and cached in SKIN_LUT_CACHE (None keeps it in
+# memory only); 'threshold' converts every ROI to YCrCb and HSV instead.
+# SKIN_SMOOTHING cleans the mask: 'box' is a 5x5 majority vote, 'morphology'
+# a close then open with a 5x5 ellipse, None leaves it as is
+SKIN_MODEL = 'lut'
+SKIN_LUT_BINS = 32
+SKIN_LUT_CACHE = '~/.cache/rppg'
+SKIN_SMOOTHING = 'box'
\ No newline at end of file
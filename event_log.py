@@ -0,0 +1,229 @@
+import argparse
+import glob
+import importlib.util
+import os
+import threading
+import time
+from collections import deque
+import numpy as np
+from config import *
+
+# One row per logged event. wall is time.time() when it was logged, time the
+# sample timestamp the pipeline used, source the stream or subject id. Frame
+# rows have no raw_bpm and update rows no motion (NaN). Estimates outside the
+# accepted BPM range are REJECTED rows: raw_bpm is the estimate, bpm the
+# published value it left unchanged.
+EVENT_DTYPE = np.dtype([
+    ('wall', 'f8'),
+    ('time', 'f8'),
+    ('source', 'i2'),
+    ('kind', 'u1'),
+    ('bpm', 'f4'),
+    ('raw_bpm', 'f4'),
+    ('confidence', 'f4'),
+    ('snr', 'f4'),
+    ('motion', 'f4')
+])
+FRAME, UPDATE, REJECTED = 0, 1, 2
+
+class EventLog:
+    # Logging an event appends a tuple to a bounded deque and nothing else; a
+    # writer thread drains it every flush_interval seconds into the current
+    # part file. Parts are Parquet (zstd, a row group per flush) when pyarrow
+    # is installed, else compressed .npz, which cannot be appended to, so
+    # every flush is a part of its own. Parts carry a .tmp suffix until
+    # rotated or closed, so readers only ever see complete files. If the
+    # writer falls behind, the oldest rows are dropped and counted rather
+    # than held. Several processes may log under the same path, so each
+    # EventLog writes into a subdirectory of its own, named after its start
+    # time and pid; path is that subdirectory.
+    def __init__(self, path, frames=EVENT_LOG_FRAMES, flush_interval=EVENT_LOG_FLUSH_INTERVAL,
+                 rotate_seconds=EVENT_LOG_ROTATE_SECONDS, max_bytes=EVENT_LOG_MAX_BYTES,
+                 max_pending=EVENT_LOG_MAX_PENDING, format=None):
+        self.frames = frames
+        self.flush_interval = flush_interval
+        self.rotate_seconds = rotate_seconds
+        self.max_bytes = max_bytes
+        self.format = format or ('parquet' if importlib.util.find_spec('pyarrow') else 'npz')
+        self.pending = deque(maxlen=max_pending)
+        self.dropped = 0
+        self.written = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        # Current part, touched by the writer thread only
+        self.part_path = None
+        self.part_started = None
+        self.parquet_writer = None
+        os.makedirs(path, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.path = os.path.join(path, name)
+        n = 0
+        while True:
+            try:
+                os.mkdir(self.path)
+                break
+            except FileExistsError:
+                n += 1
+                self.path = os.path.join(path, f'{name}_{n}')
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, name='event-log', daemon=True)
+        self.thread.start()
+        return self
+
+    def write(self, row):
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append(row)
+
+    def frame(self, timestamp, source, bpm, confidence, snr, motion):
+        if self.frames:
+            self.write((time.time(), timestamp, source, FRAME, bpm, np.nan, confidence, snr, motion))
+
+    def update(self, timestamp, source, raw_bpm, bpm, confidence, snr):
+        self.write((time.time(), timestamp, source, UPDATE, bpm, raw_bpm, confidence, snr, np.nan))
+
+    def rejected(self, timestamp, source, raw_bpm, bpm, confidence, snr):
+        self.write((time.time(), timestamp, source, REJECTED, bpm, raw_bpm, confidence, snr, np.nan))
+
+    def _loop(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+        self._finish_part()
+
+    def flush(self):
+        pending = self.pending
+        rows = [pending.popleft() for _ in range(len(pending))]
+        if self.part_path is not None and (time.time() - self.part_started >= self.rotate_seconds
+                                           or self._part_bytes() >= self.max_bytes):
+            self._finish_part()
+        if not rows:
+            return
+        events = np.array(rows, dtype=EVENT_DTYPE)
+        if self.part_path is None:
+            self._start_part(events['wall'][0])
+        if self.format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.table({name: events[name] for name in EVENT_DTYPE.names})
+            if self.parquet_writer is None:
+                self.parquet_writer = pq.ParquetWriter(self.part_path + '.tmp', table.schema, compression='zstd')
+            self.parquet_writer.write_table(table)
+        else:
+            with open(self.part_path + '.tmp', 'wb') as f:
+                np.savez_compressed(f, **{name: events[name] for name in EVENT_DTYPE.names})
+            self._finish_part()
+        self.written += len(events)
+
+    def _start_part(self, wall):
+        # Named after the first event, so parts sort by time. Back-to-back
+        # flushes can start in the same millisecond; those get a counter,
+        # which sorts after the plain name
+        stamp = _stamp(wall)
+        self.part_path = os.path.join(self.path, f'events_{stamp}.{self.format}')
+        n = 0
+        while os.path.exists(self.part_path):
+            n += 1
+            self.part_path = os.path.join(self.path, f'events_{stamp}_{n}.{self.format}')
+        self.part_started = time.time()
+
+    def _part_bytes(self):
+        tmp = self.part_path + '.tmp'
+        return os.path.getsize(tmp) if os.path.exists(tmp) else 0
+
+    def _finish_part(self):
+        if self.part_path is None:
+            return
+        tmp = self.part_path + '.tmp'
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
+        if os.path.exists(tmp):
+            os.replace(tmp, self.part_path)
+        self.part_path = None
+
+    def close(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        else:
+            self.flush()
+            self._finish_part()
+
+def _stamp(wall):
+    # Local time to the millisecond; sorts like the times it names
+    return time.strftime('%Y%m%d-%H%M%S', time.localtime(wall)) + f'-{int(wall * 1000) % 1000:03d}'
+
+def read_events(path, start=None, end=None, columns=None):
+    # Every finished part under path, searched recursively, as a dict of
+    # column arrays in time order, optionally limited to wall times in
+    # [start, end). Parts are only opened if they can overlap the range: a
+    # part named after end cannot, and neither can one whose successor in
+    # the same directory starts before start, since each directory holds
+    # one writer's parts in sequence. Parquet row groups outside the range
+    # are skipped using their statistics.
+    names = list(columns) if columns is not None else list(EVENT_DTYPE.names)
+    parts = sorted(glob.glob(os.path.join(path, '**', 'events_*.parquet'), recursive=True)
+                   + glob.glob(os.path.join(path, '**', 'events_*.npz'), recursive=True),
+                   key=os.path.basename)
+    if end is not None:
+        first = time.strftime('%Y%m%d-%H%M%S', time.localtime(end))
+        parts = [part for part in parts if os.path.basename(part)[7:22] <= first]
+    if start is not None:
+        begin = _stamp(start)
+        by_dir = {}
+        for part in parts:
+            by_dir.setdefault(os.path.dirname(part), []).append(part)
+        before = {part for group in by_dir.values()
+                  for part, following in zip(group, group[1:]) if os.path.basename(following)[7:26] < begin}
+        parts = [part for part in parts if part not in before]
+
+    chunks = []
+    for part in parts:
+        if part.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            filters = [('wall', '>=', start)] if start is not None else []
+            filters += [('wall', '<', end)] if end is not None else []
+            table = pq.read_table(part, columns=sorted(set(names) | {'wall'}), filters=filters or None)
+            chunk = {name: table.column(name).to_numpy() for name in table.column_names}
+        else:
+            with np.load(part) as data:
+                chunk = {name: data[name] for name in set(names) | {'wall'}}
+            keep = np.ones(len(chunk['wall']), dtype=bool)
+            if start is not None:
+                keep &= chunk['wall'] >= start
+            if end is not None:
+                keep &= chunk['wall'] < end
+            chunk = {name: values[keep] for name, values in chunk.items()}
+        chunks.append(chunk)
+
+    if not chunks:
+        return {name: np.empty(0, dtype=EVENT_DTYPE[name]) for name in names}
+    order = np.argsort(np.concatenate([chunk['wall'] for chunk in chunks]), kind='stable')
+    return {name: np.concatenate([chunk[name] for chunk in chunks])[order] for name in names}
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a directory of BPM event logs")
+    parser.add_argument('path', help="EVENT_LOG_DIR or any directory above it")
+    parser.add_argument('--hours', type=float, help="only the last HOURS hours")
+    args = parser.parse_args()
+
+    start = time.time() - args.hours * 3600 if args.hours else None
+    events = read_events(args.path, start=start, columns=['wall', 'source', 'kind', 'bpm', 'confidence'])
+    if len(events['wall']) == 0:
+        print("No events.")
+        return
+    print(f"{len(events['wall'])} events from {time.ctime(events['wall'][0])} to {time.ctime(events['wall'][-1])}")
+    updates = events['kind'] == UPDATE
+    for source in np.unique(events['source']):
+        mine = updates & (events['source'] == source)
+        rejected = np.count_nonzero((events['kind'] == REJECTED) & (events['source'] == source))
+        if mine.any():
+            bpm = events['bpm'][mine]
+            print(f"  source {source}: {mine.sum()} BPM updates, median {np.median(bpm):.1f} BPM "
+                  f"(range {bpm.min():.1f}-{bpm.max():.1f}), mean confidence {events['confidence'][mine].mean():.0f}"
+                  + (f", {rejected} estimates out of range" if rejected else ""))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import cv2
+import numpy as np
+from config import *
+
+# Rigid, well-textured FaceMesh landmarks: forehead, nose bridge, eye and mouth
+# corners, cheekbones and chin. Tracking this subset is enough to move the box.
+TRACKING_LANDMARKS = np.array([
+    10, 151, 9, 168, 6, 197, 195, 5, 4, 1,
+    33, 133, 263, 362, 61, 291,
+    50, 280, 101, 330, 123, 352, 234, 454,
+    152, 199, 172, 397
+])
+
+def landmark_motion(landmarks, face_widths, times):
+    # Motion index of a sequence of (478, 2) landmark sets: median displacement
+    # of the rigid subset between consecutive frames, in face widths per
+    # second, so it reads the same at any distance and frame rate. The first
+    # frame gets 0.
+    points = np.asarray(landmarks)[:, TRACKING_LANDMARKS]
+    shift = np.median(np.linalg.norm(np.diff(points, axis=0), axis=2), axis=1)
+    dt = np.diff(np.asarray(times, dtype=np.float64))
+    widths = np.maximum(np.asarray(face_widths, dtype=np.float64)[1:], 1)
+    motion = np.zeros(len(points))
+    motion[1:] = np.where(dt > 0, shift / widths / np.where(dt > 0, dt, 1), 0)
+    return motion
+
+def similarity_motion(old_points, new_points):
+    # Shift (median displacement) and scale between two point sets. Scale is
+    # the ratio of mean distances to the centroid, so translation leaves it at 1
+    shift = np.median(new_points - old_points, axis=0)
+    old_spread = np.linalg.norm(old_points - old_points.mean(axis=0), axis=1).mean()
+    new_spread = np.linalg.norm(new_points - new_points.mean(axis=0), axis=1).mean()
+    return shift, new_spread / (old_spread + 1e-6)
+
+class MotionIndex:
+    # landmark_motion one frame at a time; keeps the previous landmarks and
+    # the latest value, which the rest of the frame reads instead of recomputing
+    def __init__(self):
+        self.prev_landmarks = None
+        self.prev_time = None
+        self.value = 0.0
+
+    def update(self, landmarks, face_rect, timestamp):
+        if self.prev_landmarks is None:
+            self.value = 0.0
+        else:
+            self.value = float(landmark_motion((self.prev_landmarks, landmarks), (face_rect[2], face_rect[2]),
+                                               (self.prev_time, timestamp))[1])
+        self.prev_landmarks = landmarks
+        self.prev_time = timestamp
+        return self.value
+
+class LandmarkTracker:
+    # Carries face boxes between FaceMesh runs with pyramidal Lucas-Kanade flow
+    # on a landmark subset. track() returns None whenever a full detection is
+    # due: every `interval` frames, or as soon as the flow gets unreliable.
+    def __init__(self, interval=DETECTION_INTERVAL, max_error=TRACKING_MAX_ERROR,
+                 max_motion=TRACKING_MAX_MOTION):
+        self.interval = interval
+        self.max_error = max_error
+        self.max_motion = max_motion
+        self.lk_params = dict(winSize=(15, 15), maxLevel=2,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+        self.prev_gray = None
+        self.points = None
+        self.face_ids = None
+        self.face_rects = []
+        self.face_landmarks = []
+        self.frames_since_detection = 0
+        self.last_motion = 0.0
+
+    def reset(self, gray, face_landmarks, face_rects):
+        # face_landmarks: list of (478, 2) pixel arrays, one per face
+        if not face_rects:
+            self.prev_gray = None
+            self.face_rects = []
+            self.face_landmarks = []
+            return
+
+        self.points = np.concatenate([lm[TRACKING_LANDMARKS] for lm in face_landmarks]).astype(np.float32)
+        self.points = self.points.reshape(-1, 1, 2)
+        self.face_ids = np.repeat(np.arange(len(face_rects)), len(TRACKING_LANDMARKS))
+        self.face_rects = list(face_rects)
+        self.face_landmarks = list(face_landmarks)
+        self.prev_gray = gray
+        self.frames_since_detection = 0
+
+    def track(self, gray):
+        if self.prev_gray is None or self.frames_since_detection + 1 >= self.interval:
+            return None
+
+        new_points, status, error = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, self.points, None, **self.lk_params)
+        status = status.ravel().astype(bool)
+        if status.mean() < 0.8 or np.median(error.ravel()[status]) > self.max_error:
+            return None
+
+        delta = (new_points - self.points).reshape(-1, 2)
+        motion = np.linalg.norm(delta[status], axis=1)
+        self.last_motion = float(np.median(motion))
+        if self.last_motion > self.max_motion:
+            return None
+
+        old = self.points.reshape(-1, 2)
+        new = new_points.reshape(-1, 2)
+        face_rects = []
+        face_landmarks = []
+        for face_id, (x, y, w, h) in enumerate(self.face_rects):
+            keep = status & (self.face_ids == face_id)
+            if keep.sum() < 4:
+                return None
+            shift, scale = similarity_motion(old[keep], new[keep])
+            center = np.array([x + w / 2, y + h / 2])
+            new_center = center + shift
+            w, h = w * scale, h * scale
+            face_rects.append((int(new_center[0] - w / 2), int(new_center[1] - h / 2), int(w), int(h)))
+            # Full landmark set follows the same shift and scale
+            face_landmarks.append((self.face_landmarks[face_id] - center) * scale + new_center)
+
+        self.points = new_points
+        self.face_rects = face_rects
+        self.face_landmarks = face_landmarks
+        self.prev_gray = gray
+        self.frames_since_detection += 1
+        return face_rects
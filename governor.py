@@ -0,0 +1,126 @@
+import threading
+from config import *
+
+class FrameRateGovernor:
+    # Adjusts how much work one stream does per second of video. Three knobs,
+    # each moved one notch at a time: the interval between spectrum estimates,
+    # frame decimation (process every `stride`-th frame) and the FaceMesh input
+    # scale. Load is the time spent in the stages per second of video time, so
+    # recorded video and the benchmark are governed the same way as a camera.
+    def __init__(self, budget=GOVERNOR_CPU_BUDGET, interval=GOVERNOR_INTERVAL, min_rate=GOVERNOR_MIN_RATE):
+        self.budget = budget
+        self.interval = interval
+        self.min_rate = min_rate
+        # Chrominance methods analyse the raw frame timestamps, which a rate
+        # change would leave unevenly spaced, so they are never decimated
+        self.can_decimate = SIGNAL_METHOD == 'green'
+        self.stride = 1
+        self.cadence = 0  # index into GOVERNOR_ESTIMATE_INTERVALS
+        self.scale = 0    # index into GOVERNOR_INFERENCE_SCALES
+        self.lock = threading.Lock()
+        self.frame_count = 0
+        self.window_start = None
+        self.window_frames = 0
+        self.stage_times = {}
+        self.load = 0.0
+        self.capture_rate = None
+        self.last_estimate = None
+    
+    @property
+    def inference_scale(self):
+        return INFERENCE_SCALE * GOVERNOR_INFERENCE_SCALES[self.scale]
+    
+    @property
+    def estimate_interval(self):
+        return GOVERNOR_ESTIMATE_INTERVALS[self.cadence]
+    
+    def admit(self, timestamp):
+        # Called for every captured frame; True for the ones to process
+        with self.lock:
+            if self.window_start is None:
+                self.window_start = timestamp
+            self.window_frames += 1
+            self.frame_count += 1
+            return self.frame_count % self.stride == 0
+    
+    def estimate_due(self, timestamp):
+        if self.last_estimate is None or timestamp - self.last_estimate >= self.estimate_interval:
+            self.last_estimate = timestamp
+            return True
+        return False
+    
+    def observe(self, stage, seconds):
+        with self.lock:
+            self.stage_times[stage] = self.stage_times.get(stage, 0.0) + seconds
+    
+    def update(self, signal_processor, timestamp):
+        with self.lock:
+            if self.window_start is None or timestamp - self.window_start < self.interval:
+                return
+            elapsed = timestamp - self.window_start
+            stage_times = self.stage_times
+            self.load = sum(stage_times.values()) / elapsed
+            self.capture_rate = self.window_frames / elapsed
+            self.window_start = timestamp
+            self.window_frames = 0
+            self.stage_times = {}
+        
+        snr, confidence = signal_processor.avg_snr, signal_processor.confidence
+        good = snr >= GOVERNOR_SNR_GOOD and confidence >= GOVERNOR_CONFIDENCE_GOOD
+        
+        if self.load > self.budget:
+            # Shed first where the time goes: the spectrum when DSP dominates,
+            # otherwise frames, and the inference scale only as a last resort
+            dsp = stage_times.get('dsp', 0.0)
+            if dsp > self.load * elapsed / 2:
+                self._shed(self._slower_estimates, self._decimate, self._downscale)
+            else:
+                self._shed(self._decimate, self._slower_estimates, self._downscale)
+        elif good:
+            # A clean signal does not need every sample; resolution stays
+            self._shed(self._slower_estimates, self._decimate)
+        elif self.load < self.budget * GOVERNOR_HEADROOM:
+            # Anything short of a clean signal wins back what an overload or a
+            # clean stretch shed, one notch per interval while the CPU has room
+            self._restore()
+    
+    def _shed(self, *steps):
+        for step in steps:
+            if step():
+                return
+    
+    def _slower_estimates(self):
+        if self.cadence + 1 < len(GOVERNOR_ESTIMATE_INTERVALS):
+            self.cadence += 1
+            return True
+        return False
+    
+    def _decimate(self):
+        if self.can_decimate and self.capture_rate and self.capture_rate / (self.stride + 1) >= self.min_rate:
+            self.stride += 1
+            return True
+        return False
+    
+    def _downscale(self):
+        if self.scale + 1 < len(GOVERNOR_INFERENCE_SCALES):
+            self.scale += 1
+            return True
+        return False
+    
+    def _restore(self):
+        # Reverse order of shedding: resolution, then samples, then cadence
+        if self.scale > 0:
+            self.scale -= 1
+        elif self.stride > 1:
+            self.stride -= 1
+        elif self.cadence > 0:
+            self.cadence -= 1
+    
+    def state(self):
+        return {
+            'stride': self.stride,
+            'estimate_interval': self.estimate_interval,
+            'inference_scale': self.inference_scale,
+            'load': float(self.load),
+            'capture_rate': float(self.capture_rate) if self.capture_rate is not None else None
+        }
@@ -1,10 +1,50 @@
 import cv2
+import os
 import time
 from config import *
 from video_processor import VideoProcessor
 from roi_manager import ROIManager
 from signal_processor import SignalProcessor
 from visualization import Visualization
+from pipeline import ThreadedPipeline
+from subject_tracker import SubjectTracker
+
+WINDOW_NAME = 'Heart Rate Monitor - Three ROI System'
+
+def run_serial(video_processor, roi_manager, signal_processor, visualization, metrics=None, subject_tracker=None):
+    while True:
+        capture_start = time.perf_counter()
+        ret, frame = video_processor.cap.read()
+        timestamp = time.time()
+        if not ret:
+            break
+        if metrics is not None:
+            metrics.observe('capture', time.perf_counter() - capture_start)
+        
+        # Process the frame through the pipeline
+        if subject_tracker is not None:
+            processed_frame, current_rois = video_processor.process_subjects(
+                frame, roi_manager, subject_tracker, visualization, timestamp
+            )
+            primary = subject_tracker.primary()
+            if primary is not None:
+                signal_processor = primary.signal_processor
+                video_processor.countdown_start = primary.countdown_start
+                video_processor.countdown_active = primary.countdown_active
+        else:
+            processed_frame, current_rois = video_processor.process_frame(
+                frame, roi_manager, signal_processor, visualization, timestamp
+            )
+        
+        # Create and display the visualization
+        display_frame = visualization.create_display_frame(
+    processed_frame, signal_processor, current_rois, video_processor
+        )
+        
+        cv2.imshow(WINDOW_NAME, display_frame)
+        
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
 
 def main():
     print("Press 'q' to quit.")
@@ -15,36 +55,74 @@ def main():
     roi_manager = ROIManager()
     signal_processor = SignalProcessor()
     visualization = Visualization()
+    # Only the serial loop tracks subjects; the threaded pipeline is single-face
+    subject_tracker = SubjectTracker() if MAX_FACES > 1 and PIPELINE_MODE != 'threaded' else None
+    
+    def shown_processor():
+        # In subject mode the panels and gauges follow the primary subject
+        primary = subject_tracker.primary() if subject_tracker is not None else None
+        return primary.signal_processor if primary is not None else signal_processor
     
     try:
-        face_mesh = video_processor.initialize_camera()
+        face_mesh = video_processor.initialize_camera(max_faces=MAX_FACES if subject_tracker is not None else 1)
     except Exception as e:
         print(e)
         return
     
+    metrics = None
+    exporters = []
+    if METRICS_ENABLED:
+        # Opt-in features are imported only when switched on
+        from metrics import Metrics, instrument_pipeline, start_exporters
+        metrics = Metrics()
+        instrument_pipeline(metrics, video_processor, roi_manager, signal_processor, visualization)
+        metrics.gauge('bpm', lambda: shown_processor().current_bpm)
+        metrics.gauge('confidence', lambda: shown_processor().confidence)
+        governor = video_processor.governor
+        if governor is not None:
+            for name in ('stride', 'estimate_interval', 'inference_scale', 'load'):
+                metrics.gauge(f'governor_{name}', lambda name=name: getattr(governor, name))
+        exporters = start_exporters(metrics)
+    
+    recorder = None
+    if RECORDING_DIR is not None and subject_tracker is not None:
+        # A session holds one face per frame, so there is no subject to attribute rows to
+        print("Session recording is single-face only; set MAX_FACES = 1 to record. Not recording.")
+    elif RECORDING_DIR is not None:
+        from session_recorder import SessionRecorder
+        recorder = SessionRecorder(os.path.join(RECORDING_DIR, time.strftime('%Y%m%d-%H%M%S')))
+        video_processor.recorder = recorder
+    
+    event_log = None
+    if EVENT_LOG_DIR is not None:
+        from event_log import EventLog
+        event_log = EventLog(EVENT_LOG_DIR).start()
+        signal_processor.event_log = event_log
+        if subject_tracker is not None:
+            subject_tracker.event_log = event_log
+    
     with face_mesh as face_mesh:
         video_processor.face_mesh = face_mesh
         
-        while True:
-            ret, frame = video_processor.cap.read()
-            if not ret:
-                break
-            
-            # Process the frame through the pipeline
-            processed_frame, current_rois = video_processor.process_frame(
-                frame, roi_manager, signal_processor, visualization
-            )
-            
-            # Create and display the visualization
-            display_frame = visualization.create_display_frame(
-    processed_frame, signal_processor, current_rois, video_processor
-            )
-            
-            cv2.imshow('Heart Rate Monitor - Three ROI System', display_frame)
-            
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+        if PIPELINE_MODE == 'threaded':
+            pipeline = ThreadedPipeline(video_processor, roi_manager, signal_processor, visualization, metrics)
+            if metrics is not None:
+                for name in pipeline.queues:
+                    metrics.gauge(f'queue_depth_{name}', lambda name=name: len(pipeline.queues[name]))
+                    metrics.gauge(f'queue_dropped_{name}', lambda name=name: pipeline.queues[name].dropped)
+            pipeline.run(WINDOW_NAME)
+            print(f"Dropped frames per stage: {pipeline.dropped_frames()}")
+        else:
+            run_serial(video_processor, roi_manager, signal_processor, visualization, metrics, subject_tracker)
     
+    for exporter in exporters:
+        exporter.stop()
+    if recorder is not None:
+        recorder.close()
+        print(f"Session recorded to {recorder.path}")
+    if event_log is not None:
+        event_log.close()
+        print(f"{event_log.written} BPM events logged to {event_log.path}")
     video_processor.release()
     cv2.destroyAllWindows()
 
@@ -0,0 +1,244 @@
+import json
+import logging
+import logging.handlers
+import threading
+import time
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import *
+
+class RollingHistogram:
+    # Last `size` durations (seconds) in a ring for percentiles, plus lifetime
+    # count and sum for Prometheus-style rates
+    def __init__(self, size=METRICS_WINDOW):
+        self.values = np.zeros(size)
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds):
+        self.values[self.index] = seconds
+        self.index = (self.index + 1) % len(self.values)
+        self.count += 1
+        self.total += seconds
+
+    def summary(self):
+        recent = self.values[:min(self.count, len(self.values))]
+        if len(recent) == 0:
+            return {'count': 0, 'sum': 0.0}
+        p50, p90, p99 = np.percentile(recent, (50, 90, 99))
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'mean': float(np.mean(recent)),
+            'p50': float(p50),
+            'p90': float(p90),
+            'p99': float(p99),
+            'max': float(np.max(recent))
+        }
+
+class _StageTimer:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+class Metrics:
+    # Stage timers, counters and gauges shared by every pipeline thread.
+    # Nothing here runs unless instrument_pipeline() wrapped the stages, so a
+    # disabled build pays nothing per frame.
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.started = time.time()
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = RollingHistogram(self.window)
+            histogram.record(seconds)
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, func):
+        # func is called whenever a snapshot is taken
+        self.gauges[name] = func
+
+    def time(self, name):
+        return _StageTimer(self, name)
+
+    def wrap(self, name, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.observe(name, time.perf_counter() - start)
+        return timed
+
+    def instrument(self, obj, attr, name=None):
+        # Replaces the bound method on this instance only
+        setattr(obj, attr, self.wrap(name or attr, getattr(obj, attr)))
+
+    def snapshot(self):
+        with self.lock:
+            stages = {name: histogram.summary() for name, histogram in self.histograms.items()}
+            counters = dict(self.counters)
+        gauges = {}
+        for name, func in list(self.gauges.items()):
+            try:
+                gauges[name] = func()
+            except Exception:
+                gauges[name] = None
+        return {
+            'time': time.time(),
+            'uptime': time.time() - self.started,
+            'stages': stages,
+            'counters': counters,
+            'gauges': gauges
+        }
+
+    def prometheus_text(self):
+        snapshot = self.snapshot()
+        lines = ['# HELP rppg_stage_seconds Stage duration over the recent window',
+                 '# TYPE rppg_stage_seconds summary']
+        for stage, stats in sorted(snapshot['stages'].items()):
+            for quantile in ('p50', 'p90', 'p99'):
+                if quantile in stats:
+                    lines.append(f'rppg_stage_seconds{{stage="{stage}",quantile="0.{quantile[1:]}"}} {stats[quantile]:.6f}')
+            lines.append(f'rppg_stage_seconds_sum{{stage="{stage}"}} {stats["sum"]:.6f}')
+            lines.append(f'rppg_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'# TYPE rppg_{name}_total counter')
+            lines.append(f'rppg_{name}_total {value}')
+        for name, value in sorted(snapshot['gauges'].items()):
+            if isinstance(value, (int, float)):
+                lines.append(f'# TYPE rppg_{name} gauge')
+                lines.append(f'rppg_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+def instrument_pipeline(metrics, video_processor, roi_manager, signal_processor=None, visualization=None):
+    # Times the stages in place: detect (flip, color conversion and FaceMesh or
+    # the optical-flow tracker), roi (skin masking and ROI means), heart_rate
+    # (filtering and spectrum), update (all per-sample DSP), frame (the whole
+    # process_frame) and render. Subject mode never calls update_signals, so
+    # ingest (per-sample buffering), apply (BPM update) and the batched
+    # heart_rate for all subjects are timed as well. Frames without a face
+    # are counted.
+    detect_faces = metrics.wrap('detect', video_processor.detect_faces)
+
+    def counted_detect(frame):
+        frame, face_rects = detect_faces(frame)
+        metrics.increment('frames')
+        if not face_rects:
+            metrics.increment('frames_no_face')
+        return frame, face_rects
+    video_processor.detect_faces = counted_detect
+
+    metrics.instrument(roi_manager, 'extract_roi_signals', 'roi')
+    metrics.instrument(roi_manager, 'extract_polygon_signals', 'roi')
+    metrics.instrument(video_processor, 'update_signals', 'update')
+    metrics.instrument(video_processor, 'ingest_sample', 'ingest')
+    metrics.instrument(video_processor, 'apply_estimate', 'apply')
+    metrics.instrument(video_processor, 'estimate_subjects', 'heart_rate')
+    metrics.instrument(video_processor, 'process_frame', 'frame')
+    metrics.instrument(video_processor, 'process_subjects', 'frame')
+    if signal_processor is not None:
+        metrics.instrument(signal_processor, 'calculate_heart_rate', 'heart_rate')
+    if visualization is not None:
+        metrics.instrument(visualization, 'create_display_frame', 'render')
+
+class MetricsServer:
+    # Prometheus text exposition on GET /metrics, JSON snapshot on GET /metrics.json
+    def __init__(self, metrics, port=METRICS_PORT, host='127.0.0.1'):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body = metrics.prometheus_text().encode()
+                    content_type = 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body = json.dumps(metrics.snapshot()).encode()
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='metrics-http', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class MetricsLogger:
+    # Appends a JSON snapshot every `interval` seconds from a background thread;
+    # the file rotates at max_bytes keeping `backups` old files
+    def __init__(self, metrics, path=METRICS_LOG, interval=METRICS_LOG_INTERVAL,
+                 max_bytes=METRICS_LOG_MAX_BYTES, backups=METRICS_LOG_BACKUPS):
+        self.metrics = metrics
+        self.interval = interval
+        self.handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+        self.handler.setFormatter(logging.Formatter('%(message)s'))
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def write(self):
+        record = logging.makeLogRecord({'msg': json.dumps(self.metrics.snapshot())})
+        self.handler.emit(record)
+
+    def _loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.write()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, name='metrics-log', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+        self.write()
+        self.handler.close()
+
+def start_exporters(metrics, port=METRICS_PORT, log_path=METRICS_LOG):
+    exporters = []
+    if port is not None:
+        exporters.append(MetricsServer(metrics, port).start())
+    if log_path is not None:
+        exporters.append(MetricsLogger(metrics, log_path).start())
+    return exporters
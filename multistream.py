@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import queue
+import signal
+import threading
+import time
+import cv2
+from config import *
+from video_processor import VideoProcessor
+from roi_manager import ROIManager
+from signal_processor import SignalProcessor, calculate_heart_rates
+from pipeline import StageQueue
+from service import BPMStreamServer
+
+_END = object()
+
+class CameraStream:
+    # One source with its own capture thread and signal state. Live sources
+    # (camera indices, URLs such as rtsp://, or files with realtime=True paced
+    # to their own timestamps) keep only the newest frame; plain files queue
+    # frames and make the capture thread wait, so none are lost.
+    def __init__(self, stream_id, source, wakeup, realtime=False, deadline=MULTISTREAM_DEADLINE):
+        self.id = stream_id
+        self.source = source
+        self.wakeup = wakeup
+        self.file = isinstance(source, str) and '://' not in source
+        self.realtime = realtime or not self.file
+        self.deadline = deadline if self.realtime else None
+        self.frames = StageQueue(1, True) if self.realtime else StageQueue(MULTISTREAM_QUEUE, False)
+        self.video_processor = VideoProcessor()
+        self.roi_manager = ROIManager()
+        self.signal_processor = SignalProcessor()
+        self.thread = None
+        self.busy = False
+        self.finished = False
+        self.face_found = False
+        self.last_timestamp = None
+        self.processed = 0
+        self.missed = 0
+
+    def open(self):
+        self.video_processor.open_source(self.source)
+
+    def start(self, stop_event):
+        self.thread = threading.Thread(target=self._capture_loop, args=(stop_event,),
+                                       name=f'capture-{self.id}', daemon=True)
+        self.thread.start()
+
+    def _capture_loop(self, stop_event):
+        cap = self.video_processor.cap
+        started = time.monotonic()
+        while not stop_event.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if self.file:
+                # Container time; realtime playback waits for it like a camera
+                timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                if self.realtime and stop_event.wait(max(0.0, started + timestamp - time.monotonic())):
+                    break
+            else:
+                timestamp = time.time()
+            self.frames.put((frame, timestamp, time.monotonic()), stop_event)
+            with self.wakeup:
+                self.wakeup.notify()
+        self.frames.put(_END, stop_event)
+        with self.wakeup:
+            self.wakeup.notify()
+
+    def detect(self, frame, timestamp, face_mesh):
+        # Runs on a pool worker; the stream has at most one frame in flight
+        video_processor = self.video_processor
+        video_processor.face_mesh = face_mesh
+        frame, face_rects = video_processor.detect_faces(frame)
+        faces = []
+        for face_rect, landmarks in zip(face_rects, video_processor.face_landmarks):
+            current_rois, intensities = video_processor.extract_signals(frame, face_rect, self.roi_manager,
+                                                                       draw=False, landmarks=landmarks)
+            motion = video_processor.motion.update(landmarks, face_rect, timestamp)
+            faces.append((current_rois, intensities, motion))
+        self.face_found = bool(face_rects)
+        return faces
+
+    def state(self):
+        signal_processor = self.signal_processor
+        return {
+            'id': self.id,
+            'source': str(self.source),
+            'time': round(self.last_timestamp, 3) if self.last_timestamp is not None else None,
+            'face': self.face_found,
+            'bpm': round(float(signal_processor.current_bpm), 1),
+            'confidence': round(float(signal_processor.confidence), 1),
+            'snr': round(float(signal_processor.avg_snr), 2),
+            'processed': self.processed,
+            'dropped': self.frames.dropped + self.missed
+        }
+
+class MultiStreamHost:
+    # N sources, one pool of FaceMesh workers. FaceMesh runs in static image
+    # mode because its tracking mode carries state from the previous frame,
+    # which would come from another stream; LANDMARK_TRACKING still skips
+    # detections per stream. The scheduler hands each idle worker the next
+    # stream in round-robin order that has a frame and none in flight; a live
+    # frame older than the stream's deadline is dropped instead. Samples are
+    # collected and, every tick, ingested and estimated for all streams.
+    # Streams only share filter and FFT calls when their windows have the same
+    # length and rate, which in practice takes RESAMPLE_FS (or the governor's
+    # fixed grid); otherwise each camera's window is estimated on its own.
+    def __init__(self, sources, workers=MULTISTREAM_WORKERS, realtime=False, deadline=MULTISTREAM_DEADLINE,
+                 tick=MULTISTREAM_TICK):
+        self.wakeup = threading.Condition()
+        self.streams = [CameraStream(i, source, self.wakeup, realtime, deadline) for i, source in enumerate(sources)]
+        self.n_workers = workers
+        self.tick = tick
+        self.stop_event = threading.Event()
+        self.jobs = queue.Queue()
+        self.results = []
+        self.idle_workers = 0
+        self.next_stream = 0
+        self.face_meshes = []
+        self.workers = []
+
+    def start(self):
+        try:
+            for stream in self.streams:
+                stream.open()
+        except Exception:
+            # Release the sources that did open before giving up
+            for stream in self.streams:
+                stream.video_processor.release()
+            raise
+        # One face per stream: every sample of a stream goes into its single SignalProcessor
+        self.face_meshes = [VideoProcessor().create_face_mesh(static_image_mode=True, max_faces=1)
+                            for _ in range(self.n_workers)]
+        self.idle_workers = self.n_workers
+        self.workers = [threading.Thread(target=self._work, args=(face_mesh,), name=f'facemesh-{i}', daemon=True)
+                        for i, face_mesh in enumerate(self.face_meshes)]
+        for worker in self.workers:
+            worker.start()
+        for stream in self.streams:
+            stream.start(self.stop_event)
+
+    def _work(self, face_mesh):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            stream, frame, timestamp = job
+            faces = []
+            try:
+                faces = stream.detect(frame, timestamp, face_mesh)
+            except Exception as e:
+                # A bad frame costs that frame only; the worker stays in the pool
+                print(f"Stream {stream.id}: detection failed at {timestamp:.3f} s: {e!r}")
+            finally:
+                with self.wakeup:
+                    self.results.append((stream, timestamp, faces))
+                    stream.busy = False
+                    self.idle_workers += 1
+                    self.wakeup.notify()
+
+    def _dispatch(self):
+        # Called with self.wakeup held
+        n = len(self.streams)
+        for offset in range(n):
+            if self.idle_workers == 0:
+                return
+            index = (self.next_stream + offset) % n
+            stream = self.streams[index]
+            if stream.busy or stream.finished:
+                continue
+            item = stream.frames.get(timeout=0)
+            if item is None:
+                continue
+            if item is _END:
+                stream.finished = True
+                continue
+            frame, timestamp, captured = item
+            if stream.deadline is not None and time.monotonic() - captured > stream.deadline:
+                stream.missed += 1
+                continue
+            stream.busy = True
+            self.idle_workers -= 1
+            self.next_stream = (index + 1) % n
+            self.jobs.put((stream, frame, timestamp))
+
+    def _dsp_tick(self):
+        with self.wakeup:
+            results, self.results = self.results, []
+        updated = {}
+        for stream, timestamp, faces in results:
+            for current_rois, intensities, motion in faces:
+                stream.video_processor.ingest_sample(stream.signal_processor, None, current_rois, intensities,
+                                                     timestamp, motion)
+            stream.last_timestamp = timestamp
+            stream.processed += 1
+            if faces:
+                updated[stream.id] = stream
+
+        # One estimate per updated stream; calculate_heart_rates stacks the
+        # ones on a common grid
+        due = [stream for stream in updated.values()
+               if stream.video_processor.estimate_due(stream.signal_processor, stream.last_timestamp)]
+        estimates = calculate_heart_rates([stream.signal_processor for stream in due])
+        for stream, estimate in zip(due, estimates):
+            stream.video_processor.apply_estimate(stream.signal_processor, None, estimate,
+                                                  stream.signal_processor.analysis_fs(), stream.last_timestamp)
+
+    def run(self):
+        self.start()
+        next_tick = time.monotonic() + self.tick
+        while not self.stop_event.is_set():
+            with self.wakeup:
+                self.wakeup.wait(timeout=max(0.0, next_tick - time.monotonic()))
+                self._dispatch()
+                done = self.idle_workers == self.n_workers and all(stream.finished for stream in self.streams)
+            if done or time.monotonic() >= next_tick:
+                self._dsp_tick()
+                next_tick = time.monotonic() + self.tick
+            if done:
+                break
+        self.close()
+
+    def close(self):
+        self.stop_event.set()
+        for _ in self.workers:
+            self.jobs.put(None)
+        # No timeout: each worker gets a None after its current job, and its
+        # FaceMesh must not be closed while it is still inside process()
+        for worker in self.workers:
+            worker.join()
+        for stream in self.streams:
+            if stream.thread is not None:
+                stream.thread.join(timeout=1.0)
+            stream.video_processor.release()
+        for face_mesh in self.face_meshes:
+            face_mesh.close()
+
+    def state(self):
+        return [stream.state() for stream in self.streams]
+
+async def serve(sources, workers=MULTISTREAM_WORKERS, realtime=False, deadline=MULTISTREAM_DEADLINE,
+                host=SERVICE_HOST, port=SERVICE_PORT):
+    # Same endpoints as service.py; every message carries all streams
+    server = BPMStreamServer(host, port)
+    await server.start()
+    stream_host = MultiStreamHost(sources, workers, realtime, deadline)
+    event_log = None
+    if EVENT_LOG_DIR is not None:
+        from event_log import EventLog
+        event_log = EventLog(EVENT_LOG_DIR).start()
+        for stream in stream_host.streams:
+            stream.signal_processor.event_log = event_log
+            stream.signal_processor.source = stream.id
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    running = loop.run_in_executor(None, stream_host.run)
+    print(f"Serving {len(sources)} stream(s) with {workers} FaceMesh worker(s) on "
+          f"http://{host}:{server.port}/bpm and ws://{host}:{server.port}/ws")
+    while not running.done() and not stop.is_set():
+        server.publish({'time': round(time.time(), 3), 'streams': stream_host.state()})
+        try:
+            await asyncio.wait_for(stop.wait(), SERVICE_PUBLISH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+    stream_host.stop_event.set()
+    try:
+        await running
+    except Exception as e:
+        print(e)
+    if event_log is not None:
+        event_log.close()
+    server.publish({'time': round(time.time(), 3), 'streams': stream_host.state()})
+    for state in stream_host.state():
+        print(f"  stream {state['id']} ({state['source']}): {state['bpm']:.1f} BPM, "
+              f"{state['processed']} frames processed, {state['dropped']} dropped")
+    await server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Heart rate for several video sources sharing one FaceMesh pool")
+    parser.add_argument('sources', nargs='+', help="camera indices, video files or stream URLs")
+    parser.add_argument('--workers', type=int, default=MULTISTREAM_WORKERS, help="FaceMesh instances")
+    parser.add_argument('--realtime', action='store_true',
+                        help="play files at their own frame rate, dropping frames like a live camera")
+    parser.add_argument('--deadline', type=float, default=MULTISTREAM_DEADLINE,
+                        help="seconds a live frame may wait for a worker before it is dropped")
+    parser.add_argument('--host', default=SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    args = parser.parse_args()
+
+    sources = [int(source) if source.isdigit() else source for source in args.sources]
+    asyncio.run(serve(sources, args.workers, args.realtime, args.deadline, args.host, args.port))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import cv2
+import queue
+import threading
+import time
+from config import *
+
+_END = object()
+
+class StageQueue:
+    # Bounded hand-off between two stages. When full, either the oldest frame is
+    # discarded (keeps latency low, the producer never waits) or the producer
+    # blocks until the consumer catches up.
+    def __init__(self, maxsize=PIPELINE_QUEUE_SIZE, drop_oldest=PIPELINE_DROP_OLDEST):
+        self.queue = queue.Queue(maxsize)
+        self.drop_oldest = drop_oldest
+        self.dropped = 0
+
+    def __len__(self):
+        return self.queue.qsize()
+
+    def put(self, item, stop_event):
+        while not stop_event.is_set():
+            try:
+                if self.drop_oldest:
+                    self.queue.put_nowait(item)
+                else:
+                    self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self.drop_oldest:
+                    try:
+                        self.queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def get(self, timeout=0.1):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class ThreadedPipeline:
+    # capture -> inference -> dsp -> render, each stage on its own thread so the
+    # frame rate follows the slowest stage instead of the sum of all of them.
+    # Rendering stays on the calling thread because cv2.imshow needs it.
+    def __init__(self, video_processor, roi_manager, signal_processor, visualization, metrics=None):
+        self.video_processor = video_processor
+        self.roi_manager = roi_manager
+        self.signal_processor = signal_processor
+        self.visualization = visualization
+        self.metrics = metrics
+
+        self.stop_event = threading.Event()
+        self.state_lock = threading.Lock()
+        self.queues = {
+            'capture': StageQueue(),
+            'inference': StageQueue(),
+            'render': StageQueue()
+        }
+        self.threads = []
+
+    def queue_depths(self):
+        return {name: len(stage_queue) for name, stage_queue in self.queues.items()}
+
+    def dropped_frames(self):
+        return {name: stage_queue.dropped for name, stage_queue in self.queues.items()}
+
+    def _capture_loop(self):
+        while not self.stop_event.is_set():
+            capture_start = time.perf_counter()
+            ret, frame = self.video_processor.cap.read()
+            timestamp = time.time()
+            if not ret:
+                break
+            if self.metrics is not None:
+                self.metrics.observe('capture', time.perf_counter() - capture_start)
+            self.queues['capture'].put((frame, timestamp), self.stop_event)
+        self.queues['capture'].put(_END, self.stop_event)
+
+    def _stage_loop(self, source, target, work):
+        while not self.stop_event.is_set():
+            item = self.queues[source].get()
+            if item is None:
+                continue
+            if item is _END:
+                break
+            try:
+                result = work(item)
+            except Exception as e:
+                # A bad frame costs that frame only; the stage keeps running
+                # and still passes _END on, so run() never waits on a dead thread
+                print(f"{threading.current_thread().name} failed at {item[-1]:.3f}: {e!r}")
+                continue
+            self.queues[target].put(result, self.stop_event)
+        self.queues[target].put(_END, self.stop_event)
+
+    def _infer(self, item):
+        frame, timestamp = item
+        governor = self.video_processor.governor
+        if governor is not None and not governor.admit(timestamp):
+            # Decimated: nothing for the DSP stage, the last ROIs for display
+            frame, current_rois = self.video_processor.skip_frame(frame)
+            return frame, None, current_rois, timestamp
+
+        start = time.perf_counter()
+        frame, face_rects = self.video_processor.detect_faces(frame)
+        if not face_rects:
+            self.video_processor.record(timestamp)
+
+        faces = []
+        last_faces = []
+        for face_rect, landmarks in zip(face_rects, self.video_processor.face_landmarks):
+            current_rois, intensities = self.video_processor.extract_signals(frame, face_rect, self.roi_manager,
+                                                                            landmarks=landmarks)
+            self.video_processor.record(timestamp, face_rect, current_rois, landmarks)
+            motion = self.video_processor.motion.update(landmarks, face_rect, timestamp)
+            faces.append((current_rois, intensities, motion))
+            last_faces.append((face_rect, current_rois))
+        self.video_processor.last_faces = last_faces
+        if governor is not None:
+            governor.observe('detect', time.perf_counter() - start)
+        return frame, faces, [], timestamp
+
+    def _dsp(self, item):
+        frame, faces, current_rois, timestamp = item
+        if faces is None:
+            return frame, current_rois
+
+        governor = self.video_processor.governor
+        start = time.perf_counter()
+        with self.state_lock:
+            for current_rois, intensities, motion in faces:
+                self.video_processor.update_signals(self.signal_processor, self.visualization,
+                                                    current_rois, intensities, timestamp, motion)
+            if governor is not None:
+                governor.observe('dsp', time.perf_counter() - start)
+                governor.update(self.signal_processor, timestamp)
+        return frame, current_rois
+
+    def start(self):
+        self.threads = [
+            threading.Thread(target=self._capture_loop, name='capture', daemon=True),
+            threading.Thread(target=self._stage_loop, args=('capture', 'inference', self._infer),
+                             name='inference', daemon=True),
+            threading.Thread(target=self._stage_loop, args=('inference', 'render', self._dsp),
+                             name='dsp', daemon=True)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout=1.0)
+
+    def run(self, window_name):
+        self.start()
+
+        while not self.stop_event.is_set():
+            item = self.queues['render'].get()
+            if item is _END:
+                break
+
+            if item is not None:
+                frame, current_rois = item
+                with self.state_lock:
+                    display_frame = self.visualization.create_display_frame(
+                        frame, self.signal_processor, current_rois, self.video_processor
+                    )
+                cv2.imshow(window_name, display_frame)
+
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+
+        self.stop()
@@ -1,10 +1,100 @@
+import hashlib
+import os
+from functools import lru_cache
 import cv2
 import numpy as np
 from config import *  # ADD THIS IMPORT
 
+# FaceMesh landmark indices tracing each region's outline, in drawing order.
+# The cheeks are mirror pairs of each other.
+POLYGON_ROI_LANDMARKS = {
+    'forehead': np.array([10, 338, 297, 332, 333, 334, 296, 336, 9, 107, 66, 105, 104, 103, 67, 109]),
+    'left_cheek': np.array([117, 118, 101, 36, 205, 187, 147, 123]),
+    'right_cheek': np.array([346, 347, 330, 266, 425, 411, 376, 352])
+}
+
+def build_skin_lut(bins=SKIN_LUT_BINS):
+    # (bins, bins, bins) uint8 table over B, G, R: 255 where most colors of
+    # the bin pass both the YCrCb and the HSV bounds. Every 8-bit color is
+    # classified, one B plane at a time.
+    step = 256 // bins
+    lower_ycrcb, upper_ycrcb = np.array(SKIN_LOWER_YCRCB, np.uint8), np.array(SKIN_UPPER_YCRCB, np.uint8)
+    lower_hsv, upper_hsv = np.array(SKIN_LOWER_HSV, np.uint8), np.array(SKIN_UPPER_HSV, np.uint8)
+    green, red = np.meshgrid(np.arange(256, dtype=np.uint8), np.arange(256, dtype=np.uint8), indexing='ij')
+    counts = np.zeros((bins, bins, bins), dtype=np.int32)
+    for blue in range(256):
+        plane = np.dstack([np.full_like(green, blue), green, red])
+        mask = cv2.bitwise_and(cv2.inRange(cv2.cvtColor(plane, cv2.COLOR_BGR2YCrCb), lower_ycrcb, upper_ycrcb),
+                               cv2.inRange(cv2.cvtColor(plane, cv2.COLOR_BGR2HSV), lower_hsv, upper_hsv))
+        counts[blue // step] += (mask > 0).reshape(bins, step, bins, step).sum(axis=(1, 3))
+    return np.where(counts * 2 > step ** 3, 255, 0).astype(np.uint8)
+
+@lru_cache(maxsize=4)
+def load_skin_lut(bins=SKIN_LUT_BINS, cache=SKIN_LUT_CACHE):
+    # Cached under a name derived from the bounds, so editing them in
+    # config.py builds a new table. Shared between managers, hence read-only.
+    # _lut_index quantizes with a shift and a byte mask, which needs a power
+    # of two no larger than one byte's range.
+    if bins < 1 or bins > 256 or bins & (bins - 1):
+        raise ValueError(f"SKIN_LUT_BINS must be a power of two from 1 to 256, got {bins}")
+    bounds = repr((bins, SKIN_LOWER_YCRCB, SKIN_UPPER_YCRCB, SKIN_LOWER_HSV, SKIN_UPPER_HSV))
+    path = None
+    if cache is not None:
+        path = os.path.join(os.path.expanduser(cache),
+                            f'skin_lut_{bins}_{hashlib.sha1(bounds.encode()).hexdigest()[:12]}.npy')
+        if os.path.exists(path):
+            try:
+                lut = np.load(path)
+            except (OSError, ValueError, EOFError):
+                # Truncated or corrupt cache, e.g. from a full disk; rebuilt below
+                lut = None
+            if lut is not None and lut.shape == (bins,) * 3 and lut.dtype == np.uint8:
+                lut.flags.writeable = False
+                return lut
+    
+    lut = build_skin_lut(bins)
+    if path is not None:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            np.save(path + '.tmp.npy', lut)
+            os.replace(path + '.tmp.npy', path)
+        except OSError:
+            pass
+    lut.flags.writeable = False
+    return lut
+
+def _lut_index(image, bins):
+    # BGR image -> one integer per pixel. Padded to BGRA, each pixel reads as
+    # a little-endian uint32, so quantizing all three channels is one shift
+    # and one mask; B, G and R bins land in separate bytes of the index.
+    shift = 8 - (bins.bit_length() - 1)
+    packed = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA).view(np.uint32)[..., 0]
+    return (packed >> shift) & ((bins - 1) * 0x010101)
+
 class ROIManager:
     def __init__(self):
         self.roi_definitions = [] 
+        self.lower_ycrcb = np.array(SKIN_LOWER_YCRCB, dtype=np.uint8)
+        self.upper_ycrcb = np.array(SKIN_UPPER_YCRCB, dtype=np.uint8)
+        self.lower_hsv = np.array(SKIN_LOWER_HSV, dtype=np.uint8)
+        self.upper_hsv = np.array(SKIN_UPPER_HSV, dtype=np.uint8)
+        self.skin_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+        self.skin_lut = None
+        self.skin_table = None
+        if SKIN_MODEL == 'lut':
+            self.set_skin_lut(load_skin_lut())
+    
+    def set_skin_lut(self, lut):
+        # Swaps in a (bins, bins, bins) B, G, R table, e.g. one fitted to the
+        # current subject. The gather table is the same values spread out to
+        # the byte layout of _lut_index.
+        bins = lut.shape[0]
+        table = np.zeros((bins - 1) * 0x010101 + 1, dtype=np.uint8)
+        levels = np.arange(bins, dtype=np.uint8) * (256 // bins)
+        colors = np.stack(np.meshgrid(levels, levels, levels, indexing='ij'), axis=-1).reshape(-1, 1, 3)
+        table[_lut_index(colors, bins).ravel()] = lut.ravel()
+        self.skin_lut = lut
+        self.skin_table = table
                
     def get_three_main_rois(self, face_rect):
         x, y, w, h = face_rect
@@ -37,38 +127,135 @@ class ROIManager:
         self.roi_definitions = rois
         return rois
     
+    def get_polygon_rois(self, landmarks):
+        # landmarks: (478, 2) pixel coordinates from FaceMesh
+        rois = []
+        for name, indices in POLYGON_ROI_LANDMARKS.items():
+            points = landmarks[indices].astype(np.int32)
+            x1, y1 = points.min(axis=0)
+            x2, y2 = points.max(axis=0) + 1
+            rois.append({
+                'x1': int(x1), 'y1': int(y1), 'x2': int(x2), 'y2': int(y2),
+                'points': points, 'weight': ROI_WEIGHTS[name],
+                'name': name.replace('_', ' ').title(),
+                'color': (0, 255, 0) if name == 'forehead' else (255, 0, 0),
+                'type': 'forehead' if name == 'forehead' else 'cheek'
+            })
+        
+        self.roi_definitions = rois
+        return rois
+    
     def adaptive_skin_mask(self, roi):
         if roi.size == 0:
             return None
+        
+        if self.skin_table is not None:
+            # One gather instead of two color conversions and two inRanges
+            combined_mask = self.skin_table.take(_lut_index(roi, self.skin_lut.shape[0]))
+        else:
+            ycrcb = cv2.cvtColor(roi, cv2.COLOR_BGR2YCrCb)
+            hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
+            
+            mask_ycrcb = cv2.inRange(ycrcb, self.lower_ycrcb, self.upper_ycrcb)
+            mask_hsv = cv2.inRange(hsv, self.lower_hsv, self.upper_hsv)
             
-        ycrcb = cv2.cvtColor(roi, cv2.COLOR_BGR2YCrCb)
-        hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
+            combined_mask = cv2.bitwise_and(mask_ycrcb, mask_hsv)
         
-        lower_ycrcb = np.array(SKIN_LOWER_YCRCB, dtype=np.uint8)
-        upper_ycrcb = np.array(SKIN_UPPER_YCRCB, dtype=np.uint8)
-        mask_ycrcb = cv2.inRange(ycrcb, lower_ycrcb, upper_ycrcb)
+        if SKIN_SMOOTHING == 'box':
+            combined_mask = cv2.compare(cv2.blur(combined_mask, (5, 5)), 127, cv2.CMP_GT)
+        elif SKIN_SMOOTHING == 'morphology':
+            combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_CLOSE, self.skin_kernel)
+            combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_OPEN, self.skin_kernel)
         
-        lower_hsv = np.array(SKIN_LOWER_HSV, dtype=np.uint8)
-        upper_hsv = np.array(SKIN_UPPER_HSV, dtype=np.uint8)
-        mask_hsv = cv2.inRange(hsv, lower_hsv, upper_hsv)
+        return combined_mask
+    
+    def _clip_roi(self, frame, roi_info):
+        x1, y1 = max(0, roi_info['x1']), max(0, roi_info['y1'])
+        x2, y2 = min(frame.shape[1], roi_info['x2']), min(frame.shape[0], roi_info['y2'])
         
-        combined_mask = cv2.bitwise_and(mask_ycrcb, mask_hsv)
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return x1, y1, x2, y2
+    
+    def extract_roi_signals(self, frame, rois, scale=None):
+        # One skin segmentation over the union box of all ROIs; each ROI is then a
+        # slice of that mask and its green mean/std come from masked reductions.
+        # With scale < 1 the union box is area-averaged first, which keeps the
+        # means and shrinks the segmentation work by scale**2.
+        # Returns (mean, std, skin_pixels) per ROI, with BGR channel means/stds
+        # and pixels counted at the pooled size.
+        scale = ROI_POOL_SCALE if scale is None else scale
+        boxes = [self._clip_roi(frame, roi_info) for roi_info in rois]
+        stats = [(np.zeros(3), np.zeros(3), 0)] * len(rois)
+        valid = [box for box in boxes if box is not None]
+        if not valid:
+            return stats
         
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
-        combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_CLOSE, kernel)
-        combined_mask = cv2.morphologyEx(combined_mask, cv2.MORPH_OPEN, kernel)
+        ux1, uy1 = min(b[0] for b in valid), min(b[1] for b in valid)
+        ux2, uy2 = max(b[2] for b in valid), max(b[3] for b in valid)
+        union = frame[uy1:uy2, ux1:ux2]
+        if scale != 1:
+            width, height = max(1, int((ux2 - ux1) * scale)), max(1, int((uy2 - uy1) * scale))
+            union = cv2.resize(union, (width, height), interpolation=cv2.INTER_AREA)
+        mask = self.adaptive_skin_mask(union)
         
-        return combined_mask
+        for i, box in enumerate(boxes):
+            if box is None:
+                continue
+            x1, y1, x2, y2 = [int(v * scale) for v in (box[0] - ux1, box[1] - uy1, box[2] - ux1, box[3] - uy1)]
+            roi = union[y1:max(y2, y1 + 1), x1:max(x2, x1 + 1)]
+            roi_mask = mask[y1:max(y2, y1 + 1), x1:max(x2, x1 + 1)]
+            
+            skin_pixels = cv2.countNonZero(roi_mask)
+            if skin_pixels == 0:
+                continue
+            mean, std = cv2.meanStdDev(roi, mask=roi_mask)
+            stats[i] = (mean[:, 0], std[:, 0], skin_pixels)
+        
+        return stats
     
-    def extract_roi_signal(self, frame, roi_info):
-        x1, y1, x2, y2 = roi_info['x1'], roi_info['y1'], roi_info['x2'], roi_info['y2']
+    def extract_polygon_signals(self, frame, rois, scale=None):
+        # Polygons hug the skin, so no skin segmentation is needed. The union box
+        # is area-downsampled (means are preserved) and all polygons are
+        # rasterized into one label image at that resolution.
+        scale = POLYGON_MASK_SCALE if scale is None else scale
+        boxes = [self._clip_roi(frame, roi_info) for roi_info in rois]
+        stats = [(np.zeros(3), np.zeros(3), 0)] * len(rois)
+        valid = [box for box in boxes if box is not None]
+        if not valid:
+            return stats
         
-        x1, y1 = max(0, x1), max(0, y1)
-        x2, y2 = min(frame.shape[1], x2), min(frame.shape[0], y2)
+        ux1, uy1 = min(b[0] for b in valid), min(b[1] for b in valid)
+        ux2, uy2 = max(b[2] for b in valid), max(b[3] for b in valid)
+        union = frame[uy1:uy2, ux1:ux2]
+        width, height = max(1, int((ux2 - ux1) * scale)), max(1, int((uy2 - uy1) * scale))
+        if scale != 1:
+            union = cv2.resize(union, (width, height), interpolation=cv2.INTER_AREA)
         
-        if x2 <= x1 or y2 <= y1:
+        labels = np.zeros((height, width), dtype=np.uint8)
+        offset = np.array([ux1, uy1])
+        for i, roi_info in enumerate(rois):
+            points = ((roi_info['points'] - offset) * scale).astype(np.int32)
+            cv2.fillPoly(labels, [points], i + 1)
+        
+        for i, box in enumerate(boxes):
+            if box is None:
+                continue
+            roi_mask = (labels == i + 1).view(np.uint8)
+            pixels = cv2.countNonZero(roi_mask)
+            if pixels == 0:
+                continue
+            mean, std = cv2.meanStdDev(union, mask=roi_mask)
+            stats[i] = (mean[:, 0], std[:, 0], pixels)
+        
+        return stats
+    
+    def extract_roi_signal(self, frame, roi_info):
+        box = self._clip_roi(frame, roi_info)
+        if box is None:
             return 0, None, None
             
+        x1, y1, x2, y2 = box
         roi = frame[y1:y2, x1:x2]
         
         if roi.size == 0:
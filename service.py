@@ -0,0 +1,293 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import signal
+import struct
+import threading
+import time
+import cv2
+from config import *
+from video_processor import VideoProcessor
+from roi_manager import ROIManager
+from signal_processor import SignalProcessor
+from metrics import Metrics, instrument_pipeline
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+def _ws_frame(payload, opcode=0x1):
+    # Server frames are never masked
+    header = bytes([0x80 | opcode])
+    if len(payload) < 126:
+        header += bytes([len(payload)])
+    elif len(payload) < 1 << 16:
+        header += bytes([126]) + struct.pack('!H', len(payload))
+    else:
+        header += bytes([127]) + struct.pack('!Q', len(payload))
+    return header + payload
+
+async def _ws_read_frame(reader):
+    head = await reader.readexactly(2)
+    opcode = head[0] & 0x0F
+    length = head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', await reader.readexactly(8))[0]
+    mask = await reader.readexactly(4) if head[1] & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+class StreamClient:
+    # One WebSocket subscriber. Messages wait in a small queue; when the client
+    # falls behind the oldest are discarded, so a slow reader only loses updates
+    def __init__(self, writer, queue_size=SERVICE_CLIENT_QUEUE):
+        self.writer = writer
+        self.queue = asyncio.Queue(queue_size)
+        self.dropped = 0
+
+    def offer(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def send_loop(self):
+        while True:
+            message = await self.queue.get()
+            self.writer.write(_ws_frame(message))
+            await self.writer.drain()
+
+class BPMStreamServer:
+    # asyncio HTTP server: GET /bpm returns the latest estimate as JSON, GET /ws
+    # upgrades to a WebSocket that receives every published estimate, and
+    # GET /metrics serves Prometheus text when metrics are enabled
+    def __init__(self, host=SERVICE_HOST, port=SERVICE_PORT, queue_size=SERVICE_CLIENT_QUEUE, metrics=None):
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.metrics = metrics
+        self.clients = set()
+        self.connections = set()
+        self.latest = b'{}'
+        self.loop = None
+        self.server = None
+
+    def publish(self, payload):
+        # Called from the capture thread; never waits on the event loop
+        message = json.dumps(payload).encode()
+        self.loop.call_soon_threadsafe(self._broadcast, message)
+
+    def _broadcast(self, message):
+        self.latest = message
+        for client in self.clients:
+            client.offer(message)
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        for client in list(self.clients):
+            try:
+                client.writer.write(_ws_frame(struct.pack('!H', 1001), opcode=0x8))
+                client.writer.close()
+            except ConnectionError:
+                pass
+        # Closed sockets end the handlers' pending reads
+        if self.connections:
+            await asyncio.wait(list(self.connections), timeout=1.0)
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+            lines = request.decode('latin-1').split('\r\n')
+            method, path = lines[0].split(' ')[:2]
+            headers = {}
+            for line in lines[1:]:
+                if ':' in line:
+                    name, value = line.split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+
+            if method != 'GET':
+                await self._respond(writer, 405, b'')
+            elif path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+                await self._websocket(reader, writer, headers['sec-websocket-key'])
+            elif path == '/bpm':
+                await self._respond(writer, 200, self.latest, 'application/json')
+            elif path == '/metrics' and self.metrics is not None:
+                await self._respond(writer, 200, self.metrics.prometheus_text().encode(), 'text/plain; version=0.0.4')
+            else:
+                await self._respond(writer, 404, b'')
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, KeyError):
+            pass
+        finally:
+            writer.close()
+            self.connections.discard(task)
+
+    async def _respond(self, writer, status, body, content_type='text/plain'):
+        reason = {200: 'OK', 404: 'Not Found', 405: 'Method Not Allowed'}[status]
+        writer.write(f'HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n'
+                     f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+        await writer.drain()
+
+    async def _websocket(self, reader, writer, key):
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        writer.write(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                      f'Sec-WebSocket-Accept: {accept}\r\n\r\n').encode())
+        await writer.drain()
+
+        client = StreamClient(writer, self.queue_size)
+        client.offer(self.latest)
+        self.clients.add(client)
+        sender = asyncio.ensure_future(client.send_loop())
+        try:
+            # Incoming frames only matter for ping and close
+            while not sender.done():
+                opcode, payload = await _ws_read_frame(reader)
+                if opcode == 0x8:
+                    break
+                if opcode == 0x9:
+                    writer.write(_ws_frame(payload, opcode=0xA))
+        finally:
+            self.clients.discard(client)
+            sender.cancel()
+
+class HeadlessRunner:
+    # Capture -> FaceMesh -> ROI -> DSP without Visualization or any window.
+    # Runs on its own thread and hands results to the server at most every
+    # publish_interval seconds.
+    def __init__(self, source, server, stream_waveform=SERVICE_STREAM_WAVEFORM,
+                 publish_interval=SERVICE_PUBLISH_INTERVAL, metrics=None):
+        self.source = source
+        self.server = server
+        self.stream_waveform = stream_waveform
+        self.publish_interval = publish_interval
+        self.video_processor = VideoProcessor()
+        self.roi_manager = ROIManager()
+        self.signal_processor = SignalProcessor()
+        if metrics is not None:
+            instrument_pipeline(metrics, self.video_processor, self.roi_manager, self.signal_processor)
+        self.stop_event = threading.Event()
+        self.waveform = []
+        self.face_found = False
+
+    def _process(self, frame, timestamp):
+        video_processor, signal_processor = self.video_processor, self.signal_processor
+        governor = video_processor.governor
+        if governor is not None and not governor.admit(timestamp):
+            return self.face_found
+
+        start = time.perf_counter()
+        frame, face_rects = video_processor.detect_faces(frame)
+        if governor is not None:
+            governor.observe('detect', time.perf_counter() - start)
+
+        for face_rect, landmarks in zip(face_rects, video_processor.face_landmarks):
+            start = time.perf_counter()
+            current_rois, intensities = video_processor.extract_signals(frame, face_rect, self.roi_manager,
+                                                                       draw=False, landmarks=landmarks)
+            motion = video_processor.motion.update(landmarks, face_rect, timestamp)
+            video_processor.ingest_sample(signal_processor, None, current_rois, intensities, timestamp, motion)
+            if video_processor.estimate_due(signal_processor, timestamp):
+                fs = signal_processor.analysis_fs()
+                estimate = signal_processor.calculate_heart_rate(fs)
+                video_processor.apply_estimate(signal_processor, None, estimate, fs, timestamp)
+                if self.stream_waveform and estimate[0] is not None:
+                    self.waveform = signal_processor.display_signal(estimate[1], fs).tolist()
+            if governor is not None:
+                governor.observe('dsp', time.perf_counter() - start)
+
+        if governor is not None:
+            governor.update(signal_processor, timestamp)
+        self.face_found = bool(face_rects)
+        return self.face_found
+
+    def run(self):
+        video_processor = self.video_processor
+        video_processor.initialize_camera(self.source)
+        live = isinstance(self.source, int)
+        last_publish = 0.0
+
+        with video_processor.face_mesh:
+            while not self.stop_event.is_set():
+                ret, frame = video_processor.cap.read()
+                if not ret:
+                    break
+                timestamp = time.time() if live else video_processor.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                face_found = self._process(frame, timestamp)
+
+                now = time.monotonic()
+                if now - last_publish >= self.publish_interval:
+                    last_publish = now
+                    self.server.publish(self.payload(timestamp, face_found))
+
+        video_processor.release()
+
+    def payload(self, timestamp, face_found):
+        signal_processor = self.signal_processor
+        payload = {
+            'time': round(timestamp, 3),
+            'face': face_found,
+            'bpm': round(float(signal_processor.current_bpm), 1),
+            'confidence': round(float(signal_processor.confidence), 1),
+            'snr': round(float(signal_processor.avg_snr), 2)
+        }
+        if self.video_processor.governor is not None:
+            payload['governor'] = self.video_processor.governor.state()
+        if self.stream_waveform:
+            payload['waveform'] = [round(float(v), 4) for v in self.waveform]
+        return payload
+
+async def serve(source, host=SERVICE_HOST, port=SERVICE_PORT, stream_waveform=SERVICE_STREAM_WAVEFORM):
+    metrics = Metrics() if METRICS_ENABLED else None
+    server = BPMStreamServer(host, port, metrics=metrics)
+    await server.start()
+    runner = HeadlessRunner(source, server, stream_waveform, metrics=metrics)
+    event_log = None
+    if EVENT_LOG_DIR is not None:
+        from event_log import EventLog
+        event_log = EventLog(EVENT_LOG_DIR).start()
+        runner.signal_processor.event_log = event_log
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    capture = loop.run_in_executor(None, runner.run)
+    print(f"Streaming on http://{host}:{server.port}/bpm and ws://{host}:{server.port}/ws")
+    await asyncio.wait([capture, asyncio.ensure_future(stop.wait())], return_when=asyncio.FIRST_COMPLETED)
+
+    # Finish the frame in flight, then close the clients and the listener
+    runner.stop_event.set()
+    try:
+        await capture
+    except Exception as e:
+        print(e)
+    if event_log is not None:
+        event_log.close()
+    await server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless heart rate service streaming BPM over HTTP/WebSocket")
+    parser.add_argument('--source', default='0', help="camera index or video file")
+    parser.add_argument('--host', default=SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    parser.add_argument('--waveform', action='store_true', default=SERVICE_STREAM_WAVEFORM,
+                        help="include the filtered waveform in every message")
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    asyncio.run(serve(source, args.host, args.port, args.waveform))
+
+if __name__ == "__main__":
+    main()
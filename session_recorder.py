@@ -0,0 +1,191 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import numpy as np
+import config
+from config import *
+from video_processor import VideoProcessor
+from signal_processor import SignalProcessor
+from face_tracker import landmark_motion
+
+N_LANDMARKS = 478
+
+def record_dtype(n_rois, landmarks=False):
+    # One fixed-size record per captured frame. face is (x, y, w, h), all zero
+    # when no face was found; mean/std are per-ROI B, G, R as from cv2.
+    fields = [
+        ('time', 'f8'),
+        ('face', 'i4', (4,)),
+        ('mean', 'f4', (n_rois, 3)),
+        ('std', 'f4', (n_rois, 3)),
+        ('pixels', 'i4', (n_rois,))
+    ]
+    if landmarks:
+        fields.append(('landmarks', 'f4', (N_LANDMARKS, 2)))
+    return np.dtype(fields)
+
+class SessionRecorder:
+    # Append-only session of .npy chunks plus meta.json. Each chunk is created
+    # at full size with open_memmap and filled in place, so writing a frame is
+    # a memory store; unfilled records keep time == 0 and are ignored on read,
+    # which also makes a session cut short by a crash readable.
+    def __init__(self, path, landmarks=RECORD_LANDMARKS, chunk_frames=RECORDING_CHUNK_FRAMES):
+        self.path = path
+        self.landmarks = landmarks
+        self.chunk_frames = chunk_frames
+        self.meta = None
+        self.dtype = None
+        self.chunk = None
+        self.counts = []
+        os.makedirs(path, exist_ok=True)
+
+    def _start(self, rois):
+        self.dtype = record_dtype(len(rois), self.landmarks)
+        self.meta = {
+            'version': 1,
+            'rois': [{'name': roi['name'], 'type': roi['type'], 'weight': roi['weight']} for roi in rois],
+            'landmarks': self.landmarks,
+            'chunk_frames': self.chunk_frames,
+            'counts': self.counts,
+            'config': {name: getattr(config, name) for name in dir(config)
+                       if name.isupper() and isinstance(getattr(config, name), (int, float, str, bool, type(None)))}
+        }
+
+    def _next_chunk(self):
+        if self.chunk is not None:
+            self.chunk.flush()
+        path = os.path.join(self.path, f'chunk_{len(self.counts):05d}.npy')
+        self.chunk = np.lib.format.open_memmap(path, mode='w+', dtype=self.dtype, shape=(self.chunk_frames,))
+        self.counts.append(0)
+        self._write_meta()
+
+    def _write_meta(self):
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f, indent=2)
+
+    def write(self, timestamp, face_rect=None, rois=(), stats=(), landmarks=None):
+        if self.meta is None:
+            if not rois:
+                return
+            self._start(rois)
+        if self.chunk is None or self.counts[-1] == self.chunk_frames:
+            self._next_chunk()
+
+        record = self.chunk[self.counts[-1]]
+        record['time'] = timestamp
+        if face_rect is not None:
+            if len(stats) != len(self.meta['rois']):
+                raise ValueError(f"Session was started with {len(self.meta['rois'])} ROIs, got {len(stats)}")
+            record['face'] = face_rect
+            for i, (mean, std, pixels) in enumerate(stats):
+                record['mean'][i] = mean
+                record['std'][i] = std
+                record['pixels'][i] = pixels
+            if self.landmarks and landmarks is not None:
+                record['landmarks'] = landmarks
+        self.counts[-1] += 1
+
+    def close(self):
+        if self.chunk is not None:
+            self.chunk.flush()
+            self._write_meta()
+            self.chunk = None
+
+class SessionReader:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+
+    def chunks(self):
+        # Memory-mapped views, trimmed to the records actually written
+        for path in sorted(glob.glob(os.path.join(self.path, 'chunk_*.npy'))):
+            chunk = np.load(path, mmap_mode='r')
+            filled = np.flatnonzero(chunk['time'] != 0)
+            yield chunk[:filled[-1] + 1] if len(filled) else chunk[:0]
+
+    def records(self):
+        return np.concatenate(list(self.chunks()))
+
+    def rois(self):
+        # Minimal ROI dicts, enough for the weighting and combining steps
+        return [dict(roi, color=(0, 255, 0)) for roi in self.meta['rois']]
+
+    def intensities(self, records):
+        return record_intensities(records['mean'])
+
+    def motion(self, records):
+        # Motion index per record, as computed live over the frames with a
+        # face; None when the session was recorded without landmarks
+        if 'landmarks' not in records.dtype.names:
+            return None
+        motion = np.zeros(len(records))
+        found = records['face'][:, 2] > 0
+        if found.any():
+            motion[found] = landmark_motion(records['landmarks'][found], records['face'][found, 2],
+                                            records['time'][found])
+        return motion
+
+def record_intensities(means):
+    # (frames, n_rois, 3) BGR means -> per-frame SignalProcessor.add_sample
+    # input, as extract_signals builds it for the configured SIGNAL_METHOD
+    if SIGNAL_METHOD == 'green':
+        return means[:, :, 1].astype(np.float64)
+    return means[:, :, ::-1].astype(np.float64)
+
+def replay_samples(times, intensities, found, rois, signal_processor=None, estimate_interval=0.0, motion=None):
+    # Feeds recorded ROI statistics through the same ingest/estimate path as
+    # live capture, without FaceMesh or any image work. estimate_interval > 0
+    # runs the spectrum only that often (seconds) instead of on every frame;
+    # motion is the per-frame motion index, if known.
+    # Returns rows of (time, bpm, snr, confidence) for frames with a face.
+    video_processor = VideoProcessor()
+    signal_processor = signal_processor if signal_processor is not None else SignalProcessor()
+    motion = motion if motion is not None else np.zeros(len(times))
+    last_estimate = None
+    rows = []
+    for timestamp, sample, face, frame_motion in zip(times, intensities, found, motion):
+        if not face:
+            continue
+        video_processor.ingest_sample(signal_processor, None, rois, sample, timestamp, frame_motion)
+        if len(signal_processor.timestamps) > 45:
+            if last_estimate is None or timestamp - last_estimate >= estimate_interval:
+                last_estimate = timestamp
+                fs = signal_processor.analysis_fs()
+                estimate = signal_processor.calculate_heart_rate(fs)
+                video_processor.apply_estimate(signal_processor, None, estimate, fs, timestamp)
+        rows.append((timestamp, signal_processor.current_bpm, signal_processor.avg_snr, signal_processor.confidence))
+
+    return np.array(rows).reshape(-1, 4)
+
+def replay_session(path, signal_processor=None, estimate_interval=0.0):
+    reader = SessionReader(path)
+    records = reader.records()
+    return replay_samples(records['time'], reader.intensities(records), records['face'][:, 2] > 0,
+                          reader.rois(), signal_processor, estimate_interval, reader.motion(records))
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded session through the signal processing")
+    parser.add_argument('session', help="session directory written by SessionRecorder")
+    parser.add_argument('--output', help="CSV file for the time, bpm, snr, confidence series")
+    parser.add_argument('--estimate-interval', type=float, default=0.0,
+                        help="seconds between spectrum estimates (0 estimates every frame, as live)")
+    args = parser.parse_args()
+
+    rows = replay_session(args.session, estimate_interval=args.estimate_interval)
+    if len(rows):
+        print(f"{len(rows)} samples over {rows[-1, 0] - rows[0, 0]:.1f} s, final {rows[-1, 1]:.1f} BPM")
+    else:
+        print("No face samples in session.")
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['time', 'bpm', 'snr', 'confidence'])
+            for timestamp, bpm, snr, confidence in rows:
+                writer.writerow([f"{timestamp:.3f}", f"{bpm:.2f}", f"{snr:.2f}", f"{confidence:.1f}"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import numpy as np
+
+class SignalBuffer:
+    # Fixed-capacity ring of (timestamp, channel values) samples. Every sample is
+    # written twice, at pos and pos + capacity, so the live window is always one
+    # contiguous slice and can be handed out as a view without copying.
+    def __init__(self, capacity, n_channels, dtype=np.float32):
+        self.capacity = capacity
+        self.n_channels = n_channels
+        self._times = np.zeros(2 * capacity, dtype=np.float64)
+        self._data = np.zeros((n_channels, 2 * capacity), dtype=dtype)
+        self._head = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def is_full(self):
+        return self._size == self.capacity
+
+    @property
+    def times(self):
+        return self._times[self._head:self._head + self._size]
+
+    def window(self, channels=slice(None)):
+        return self._data[channels, self._head:self._head + self._size]
+
+    def channel(self, index):
+        return self._data[index, self._head:self._head + self._size]
+
+    def latest(self):
+        return self._data[:, self._head + self._size - 1]
+
+    def append(self, timestamp, values=()):
+        if self._size == self.capacity:
+            self.drop(1)
+
+        pos = (self._head + self._size) % self.capacity
+        n = len(values)
+        for p in (pos, pos + self.capacity):
+            self._times[p] = timestamp
+            self._data[:n, p] = values
+            self._data[n:, p] = 0
+        self._size += 1
+
+    def set_latest(self, channel, value):
+        pos = (self._head + self._size - 1) % self.capacity
+        self._data[channel, pos] = value
+        self._data[channel, pos + self.capacity] = value
+
+    def set_tail(self, channel, values):
+        # Overwrites the last len(values) samples of one channel, in both copies
+        count = min(len(values), self._size)
+        if count == 0:
+            return
+        positions = (self._head + self._size - count + np.arange(count)) % self.capacity
+        self._data[channel, positions] = values[-count:]
+        self._data[channel, positions + self.capacity] = values[-count:]
+
+    def interpolate_tail(self, count, channels=slice(None)):
+        # Replaces the `count` samples before the latest one with a straight
+        # line in time between their neighbours, in both copies
+        if count <= 0 or count + 2 > self._size:
+            return
+        start = self._size - count - 2
+        times = self.times[start:]
+        values = self.window(channels)[:, start:]
+        span = times[-1] - times[0]
+        fraction = (times[1:-1] - times[0]) / span if span > 0 else np.linspace(0, 1, count + 2)[1:-1]
+        filled = values[:, :1] + (values[:, -1:] - values[:, :1]) * fraction
+        rows = np.arange(self.n_channels)[channels][:, None]
+        positions = (self._head + start + 1 + np.arange(count)) % self.capacity
+        self._data[rows, positions] = filled
+        self._data[rows, positions + self.capacity] = filled
+
+    def drop(self, count):
+        count = min(count, self._size)
+        self._head = (self._head + count) % self.capacity
+        self._size -= count
+
+    def expired_count(self, max_age):
+        if self._size < 2:
+            return 0
+        times = self.times
+        return int(np.searchsorted(times, times[-1] - max_age, side='left'))
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
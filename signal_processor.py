@@ -1,92 +1,300 @@
 import numpy as np
-from scipy.signal import find_peaks
+from collections import deque
 from utils import *
 from config import *  # ADD THIS IMPORT
+from signal_buffer import SignalBuffer
 
 class SignalProcessor:
     def __init__(self):
-        self.roi_signals = {}
-        self.roi_weights = {}
-        self.timestamps = []
+        self.buffer = None
+        self.roi_weights = np.empty(0)
+        self.last_quality_time = None
         self.bpm_history = []
         self.snr_history = []
         self.current_bpm = 0
         self.confidence = 0
         self.avg_snr = 0
+        # Chrominance methods rebuild the pulse from the RGB window each estimate
+        self.chrominance = SIGNAL_METHOD in ('pos', 'chrom')
+        self.spectrum_estimator = None
+        self.stream_filter = None
+        self.resampler = None
+        # The governor changes the frame rate at runtime, so its streams are
+        # analysed on a fixed grid at the lowest rate it decimates to
+        self.resample_fs = RESAMPLE_FS or (GOVERNOR_MIN_RATE if GOVERNOR_ENABLED else None)
+        if not self.chrominance:
+            if SPECTRUM_MODE == 'welch':
+                from spectral_estimator import WelchSpectrumEstimator
+                self.spectrum_estimator = WelchSpectrumEstimator()
+            if FILTER_MODE == 'streaming':
+                self.stream_filter = StreamingBandpassFilter(BANDPASS_LOWCUT, BANDPASS_HIGHCUT, FILTER_ORDER)
+            if self.resample_fs:
+                self.resampler = UniformResampler(self.resample_fs)
+        self.uniform = None
+        self.rgb = None
+        self.latest_rgb = None
+        self.last_result = None
+        # Samples taken while the head moved: the current run at the end of
+        # the buffer, the times of all interpolated samples still held and the
+        # time of the last frame over the threshold
+        self.motion_run = 0
+        self.motion_times = deque()
+        self.last_motion = -np.inf
+        # BPM event log (see event_log.py) and the stream or subject id its
+        # rows carry
+        self.event_log = None
+        self.source = 0
+    
+    @property
+    def timestamps(self):
+        if self.buffer is None:
+            return np.empty(0)
+        return self.buffer.times
+    
+    @property
+    def combined_signal(self):
+        if self.buffer is None:
+            return np.empty(0, dtype=np.float32)
+        return self.buffer.channel(self.buffer.n_channels - 2)
+    
+    @property
+    def filtered_signal(self):
+        if self.buffer is None:
+            return np.empty(0, dtype=np.float32)
+        return self.buffer.channel(self.buffer.n_channels - 1)
+    
+    def roi_matrix(self, n_rois=None):
+        if self.buffer is None:
+            return np.empty((0, 0), dtype=np.float32)
+        if n_rois is None:
+            n_rois = self.buffer.n_channels - 2
+        return self.buffer.window(slice(0, n_rois))
+    
+    def estimate_fs(self):
+        times = self.timestamps
+        if len(times) < 10 or times[-1] <= times[0]:
+            return 30
+        return len(times) / (times[-1] - times[0])
+    
+    def analysis_fs(self):
+        return self.resample_fs if self.resampler is not None else self.estimate_fs()
+    
+    def analysis_window(self):
+        # (times, combined, streaming-filtered) on the grid the DSP runs on
+        if self.rgb is not None:
+            return self.chrominance_window()
+        if self.uniform is not None:
+            return self.uniform.times, self.uniform.channel(0), self.uniform.channel(1)
+        return self.timestamps, self.combined_signal, self.filtered_signal
+    
+    def chrominance_window(self):
+        # Tail of the buffer as (times, pulse, pulse); the pulse is derived
+        # from the quality-weighted skin color of the ROIs
+        times = self.timestamps
+        if len(times) < 2:
+            return times, np.empty(0), np.empty(0)
+        start = int(np.searchsorted(times, times[-1] - CHROMINANCE_ANALYSIS_DURATION, side='left'))
+        pulse = chrominance_pulse(self.rgb.window()[:, start:], self.estimate_fs(), SIGNAL_METHOD)
+        return times[start:], pulse, pulse
+    
+    def add_sample(self, timestamp, intensities, motion=0.0):
+        # ROI channels followed by the combined signal and its streaming-filtered
+        # copy, both filled in by combine_roi_signals. Chrominance methods pass
+        # an (n_rois, 3) RGB array: green feeds the ROI channels and the weighted
+        # color goes into self.rgb, kept in step with the main buffer.
+        rgb = None
+        if np.ndim(intensities) == 2:
+            rgb = np.asarray(intensities, dtype=np.float64)
+            intensities = rgb[:, 1]
+        
+        # The index drops to zero at each turn of a shake, so frames shortly
+        # after a flagged one count as moving too
+        if motion > MOTION_THRESHOLD:
+            self.last_motion = timestamp
+        held = (MOTION_REJECTION and timestamp - self.last_motion < MOTION_HOLD and self.buffer is not None
+                and len(self.buffer) > 0 and self.buffer.n_channels == len(intensities) + 2)
+        if held:
+            # Repeat the last clean values; combine_roi_signals fills the run
+            # in once a clean sample arrives, in the raw buffer and on the
+            # resampled grid. The streaming filter (FILTER_MODE 'streaming')
+            # has already consumed the held values, so its output only gets
+            # the hold: a flat stretch and a step, but no motion spike
+            intensities = self.buffer.latest()[:len(intensities)].copy()
+            rgb = self.latest_rgb if rgb is not None else None
+            self.motion_run += 1
+            self.motion_times.append(timestamp)
+        
+        if self.buffer is None or self.buffer.n_channels != len(intensities) + 2:
+            self.buffer = SignalBuffer(BUFFER_CAPACITY, len(intensities) + 2)
+            if self.stream_filter is not None:
+                self.stream_filter.reset()
+            if self.spectrum_estimator is not None:
+                self.spectrum_estimator.reset()
+            if self.resampler is not None:
+                self.resampler.reset()
+                self.uniform = SignalBuffer(int(BUFFER_DURATION * self.resample_fs * 1.5), 2)
+            self.rgb = SignalBuffer(BUFFER_CAPACITY, 3) if rgb is not None else None
+            self.motion_run = 0
+            self.motion_times.clear()
+        self.buffer.append(timestamp, intensities)
+        if self.rgb is not None:
+            self.rgb.append(timestamp)
+            self.latest_rgb = rgb
+        if self.event_log is not None:
+            self.event_log.frame(timestamp, self.source, self.current_bpm, self.confidence, self.avg_snr, motion)
         
     def calculate_roi_quality(self, roi_signals):
+        roi_signals = np.asarray(roi_signals, dtype=np.float64)
         if len(self.timestamps) < 10:
-            return [0.5] * len(roi_signals)
+            return np.full(len(roi_signals), 0.5)
+        if roi_signals.shape[1] < 10:
+            return np.full(len(roi_signals), 0.1)
         
-        fs = len(self.timestamps) / (self.timestamps[-1] - self.timestamps[0]) if self.timestamps[-1] > self.timestamps[0] else 30
+        fs = self.estimate_fs()
         
-        quality_scores = []
-        for signal in roi_signals:
-            if len(signal) < 10:
-                quality_scores.append(0.1)
-                continue
-                
-            snr = calculate_snr(signal, fs)
-            signal_diff = np.diff(signal)
-            stability = 1.0 / (np.std(signal_diff) + 1e-10)
-            stability = min(1.0, stability / 100.0)
-            
-            quality = 0.7 * min(1.0, snr / 10.0) + 0.3 * stability
-            quality_scores.append(max(0.1, min(1.0, quality)))
+        snr = calculate_snr_batch(roi_signals, fs)
+        stability = 1.0 / (np.std(np.diff(roi_signals, axis=1), axis=1) + 1e-10)
+        stability = np.minimum(1.0, stability / 100.0)
         
-        return quality_scores
+        quality = 0.7 * np.minimum(1.0, snr / 10.0) + 0.3 * stability
+        return np.clip(quality, 0.1, 1.0)
     
     def update_roi_weights(self, current_rois):
         if len(self.timestamps) > 10:
-            roi_qualities = self.calculate_roi_quality([self.roi_signals[i] for i in range(len(current_rois))])
+            # Quality moves slowly; rescoring every QUALITY_REFRESH_INTERVAL seconds is enough
+            now = self.timestamps[-1]
+            if (len(self.roi_weights) == len(current_rois) and self.last_quality_time is not None
+                    and now - self.last_quality_time < QUALITY_REFRESH_INTERVAL):
+                return
+            self.last_quality_time = now
+            
+            roi_qualities = self.calculate_roi_quality(self.roi_matrix(len(current_rois)))
             
-            total_quality = sum(roi_qualities)
+            total_quality = np.sum(roi_qualities)
             if total_quality > 0:
-                for i in range(len(current_rois)):
-                    self.roi_weights[i] = roi_qualities[i] / total_quality
+                self.roi_weights = roi_qualities / total_quality
             else:
-                for i, roi_info in enumerate(current_rois):
-                    self.roi_weights[i] = roi_info['weight']
+                self.roi_weights = np.array([roi_info['weight'] for roi_info in current_rois])
     
     def combine_roi_signals(self, current_rois):
         combined_signal = 0
-        total_weight = 0
+        latest = self.buffer.latest()
         
-        for i in range(len(current_rois)):
-            if i in self.roi_weights and len(self.roi_signals[i]) > 0:
-                weight = self.roi_weights[i]
-                combined_signal += self.roi_signals[i][-1] * weight
-                total_weight += weight
+        n = min(len(current_rois), len(self.roi_weights))
+        weights = self.roi_weights[:n]
+        total_weight = np.sum(weights)
         
         if total_weight > 0:
-            combined_signal /= total_weight
+            combined_signal = float(np.dot(latest[:n], weights) / total_weight)
+            if self.rgb is not None:
+                color = weights @ self.latest_rgb[:n] / total_weight
+                for channel in range(3):
+                    self.rgb.set_latest(channel, color[channel])
         
-        if 'combined' not in self.roi_signals:
-            self.roi_signals['combined'] = []
-        self.roi_signals['combined'].append(combined_signal)
+        self.buffer.set_latest(self.buffer.n_channels - 2, combined_signal)
+        run_start = None
+        if self.motion_run and self.motion_times[-1] != self.buffer.times[-1]:
+            # First clean sample after motion: bridge the held run
+            if self.motion_run + 2 <= len(self.buffer):
+                run_start = self.buffer.times[-self.motion_run - 2]
+            self.buffer.interpolate_tail(self.motion_run, slice(0, self.buffer.n_channels - 1))
+            if self.rgb is not None:
+                self.rgb.interpolate_tail(self.motion_run)
+            self.motion_run = 0
+        if self.resampler is not None:
+            self._push_uniform(self.buffer.times[-1], combined_signal)
+            if run_start is not None and not self.resampler.restarted:
+                # Grid points the held run produced are resampled again from
+                # the bridged raw samples, as if the run had been clean
+                grid = self.uniform.times
+                first = int(np.searchsorted(grid, run_start, side='right'))
+                if first < len(grid):
+                    self.uniform.set_tail(0, np.interp(grid[first:], self.buffer.times, self.combined_signal))
+        elif self.stream_filter is not None:
+            filtered = self.stream_filter.process([combined_signal], self.estimate_fs())
+            self.buffer.set_latest(self.buffer.n_channels - 1, filtered[0])
         
         return combined_signal
     
+    def _push_uniform(self, timestamp, value):
+        grid, values = self.resampler.push(timestamp, value)
+        if self.resampler.restarted:
+            # Nothing is invented across the gap; the window refills from here
+            self.uniform.clear()
+            if self.stream_filter is not None:
+                self.stream_filter.reset()
+            if self.spectrum_estimator is not None:
+                self.spectrum_estimator.reset()
+        if len(grid) == 0:
+            return
+        
+        if self.stream_filter is not None:
+            filtered = self.stream_filter.process(values, self.resample_fs)
+        else:
+            filtered = np.zeros(len(values))
+        for t, v, f in zip(grid, values, filtered):
+            self.uniform.append(t, (v, f))
+    
+    def _filter_window(self, fs):
+        _, combined, filtered = self.analysis_window()
+        if self.stream_filter is not None:
+            return np.array(filtered, dtype=np.float64)
+        normalized = normalize_signal(combined)
+        return butter_bandpass_filter(normalized, BANDPASS_LOWCUT, BANDPASS_HIGHCUT, fs, FILTER_ORDER)
+    
+    def display_signal(self, filtered, fs, length=100):
+        # Causal output lags and carries start-up transients; the display can
+        # optionally re-run a zero-phase pass over a short tail instead
+        if self.stream_filter is None or not DISPLAY_ZERO_PHASE:
+            return filtered[-length:]
+        tail = normalize_signal(self.analysis_window()[1][-3 * length:])
+        if len(tail) <= 3 * (2 * FILTER_ORDER + 1):
+            return tail
+        return butter_bandpass_filter(tail, BANDPASS_LOWCUT, BANDPASS_HIGHCUT, fs, FILTER_ORDER)[-length:]
+    
+    def motion_blocked(self):
+        # No estimate while the head is moving or the window is mostly filled in
+        return self.motion_run > 0 or len(self.motion_times) > MOTION_MAX_FRACTION * len(self.timestamps)
+    
     def calculate_heart_rate(self, fs):
-        if len(self.roi_signals['combined']) <= 45:
+        if len(self.timestamps) <= 45 or self.motion_blocked():
             return None, None, None, None
+        if self.chrominance:
+            filtered = self._filter_window(fs)
+            # The analysis window is short, so zero-pad to keep BPM resolution
+            n = max(len(filtered), int(fs / SPECTRUM_RESOLUTION))
+            freqs, fft_values = compute_spectrum(filtered, fs, n=n)
+            return self._estimate_bpm(filtered, freqs, fft_values, fs)
+        
+        times, signal, _ = self.analysis_window()
+        if self.resampler is not None:
+            fs = self.resample_fs
+            if len(signal) <= 45:
+                return None, None, None, None
+        
+        if self.spectrum_estimator is not None:
+            updated = self.spectrum_estimator.update(times, signal, fs)
+            if self.spectrum_estimator.has_spectrum:
+                if not updated and self.last_result is not None:
+                    return self.last_result
+                
+                filtered = self._filter_window(fs)
+                freqs, fft_values = self.spectrum_estimator.spectrum()
+                self.last_result = self._estimate_bpm(filtered, freqs, fft_values, fs)
+                return self.last_result
         
-        signal = self.roi_signals['combined']
-        normalized = normalize_signal(signal)
-        filtered = butter_bandpass_filter(normalized, BANDPASS_LOWCUT, BANDPASS_HIGHCUT, fs, FILTER_ORDER)
+        filtered = self._filter_window(fs)
+        freqs, fft_values = compute_spectrum(filtered, fs)
         
-        snr = calculate_snr(filtered, fs)
+        return self._estimate_bpm(filtered, freqs, fft_values, fs)
+    
+    def _estimate_bpm(self, filtered, freqs, fft_values, fs):
+        snr = spectrum_snr(freqs, fft_values)
         self.snr_history.append(snr)
         if len(self.snr_history) > 5:
             self.snr_history.pop(0)
         self.avg_snr = np.mean(self.snr_history)
         
-        N = len(filtered)
-        freqs = fftfreq(N, 1/fs)
-        fft_values = np.abs(fft(filtered))
-        freqs = freqs[:N//2]
-        fft_values = fft_values[:N//2]
-        
         valid_idx = np.where((freqs >= 0.8) & (freqs <= 3.5))
         if len(valid_idx[0]) == 0:
             return None, None, None, None
@@ -94,6 +302,9 @@ class SignalProcessor:
         dominant_idx = np.argmax(fft_values[valid_idx])
         fft_bpm = freqs[valid_idx][dominant_idx] * 60.0
         
+        # Imported outside the try, so a broken SciPy fails loudly instead of
+        # quietly leaving FFT-only estimates
+        from scipy.signal import find_peaks
         try:
             peaks, _ = find_peaks(filtered, distance=fs/2.5, height=np.std(filtered)*0.5)
             if len(peaks) > 1:
@@ -101,7 +312,7 @@ class SignalProcessor:
                 avg_interval = np.mean(peak_intervals)
                 peak_bpm = 60.0 / avg_interval
                 
-                if self.avg_snr > 3:
+                if self.avg_snr > PEAK_FUSION_SNR:
                     combined_bpm = (fft_bpm + peak_bpm) / 2
                 else:
                     combined_bpm = fft_bpm
@@ -113,7 +324,8 @@ class SignalProcessor:
         return combined_bpm, filtered, freqs, fft_values
     
     def update_bpm(self, new_bpm):
-        if 40 <= new_bpm <= 180:
+        accepted = 40 <= new_bpm <= 180
+        if accepted:
             self.bpm_history.append(new_bpm)
             if len(self.bpm_history) > 12:
                 self.bpm_history.pop(0)
@@ -121,10 +333,55 @@ class SignalProcessor:
             smoothed_bpm = np.median(self.bpm_history)
             self.current_bpm = smoothed_bpm
             self.confidence = min(100, self.avg_snr * 20)
+        if self.event_log is not None:
+            # Out-of-range estimates change nothing, so they are not logged as updates
+            timestamp = self.timestamps[-1] if len(self.timestamps) else np.nan
+            log = self.event_log.update if accepted else self.event_log.rejected
+            log(timestamp, self.source, new_bpm, self.current_bpm, self.confidence, self.avg_snr)
     
     def cleanup_buffers(self):
-        while len(self.timestamps) > 1 and (self.timestamps[-1] - self.timestamps[0]) > BUFFER_DURATION:
-            self.timestamps.pop(0)
-            for key in self.roi_signals:
-                if len(self.roi_signals[key]) > 0:
-                    self.roi_signals[key].pop(0)
\ No newline at end of file
+        if self.buffer is not None:
+            self.buffer.drop(self.buffer.expired_count(BUFFER_DURATION))
+        if self.uniform is not None:
+            self.uniform.drop(self.uniform.expired_count(BUFFER_DURATION))
+        if self.rgb is not None:
+            self.rgb.drop(len(self.rgb) - len(self.buffer))
+        start = self.timestamps[0] if len(self.timestamps) else np.inf
+        while self.motion_times and self.motion_times[0] < start:
+            self.motion_times.popleft()
+
+def calculate_heart_rates(processors):
+    # Batched calculate_heart_rate for several subjects seen by the same camera,
+    # each at its own analysis_fs(). Windows of the same length whose rates
+    # share a filter design are stacked into one subjects x samples matrix and
+    # filtered/transformed in a single call; the frequency axis is then per
+    # subject, so every result matches calculate_heart_rate. Processors running
+    # the incremental estimator or streaming filter already avoid the full
+    # recompute, and chrominance windows are zero-padded per rate, so those are
+    # handled one by one.
+    estimates = [None] * len(processors)
+    groups = {}
+    for i, processor in enumerate(processors):
+        fs = processor.analysis_fs()
+        if len(processor.timestamps) <= 45 or processor.motion_blocked():
+            estimates[i] = (None, None, None, None)
+        elif (processor.spectrum_estimator is not None or processor.stream_filter is not None
+              or processor.chrominance):
+            estimates[i] = processor.calculate_heart_rate(fs)
+        else:
+            window = processor.analysis_window()[1]
+            # A resampled window can still be short when the raw buffer is ready
+            if len(window) <= 45:
+                estimates[i] = (None, None, None, None)
+            else:
+                groups.setdefault((len(window), round(fs, 1)), []).append((i, fs, window))
+    
+    for (N, design_fs), members in groups.items():
+        matrix = np.array([normalize_signal(window) for _, _, window in members])
+        filtered = butter_bandpass_filter(matrix, BANDPASS_LOWCUT, BANDPASS_HIGHCUT, design_fs, FILTER_ORDER, axis=1)
+        _, spectra = compute_spectrum(filtered, design_fs, axis=1)
+        for row, (i, fs, _) in enumerate(members):
+            freqs = np.fft.rfftfreq(N, 1 / fs)
+            estimates[i] = processors[i]._estimate_bpm(filtered[row], freqs, spectra[row], fs)
+    
+    return estimates
\ No newline at end of file
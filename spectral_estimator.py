@@ -0,0 +1,80 @@
+import numpy as np
+from collections import deque
+from scipy.fft import rfft, rfftfreq, next_fast_len
+from scipy.signal import sosfreqz, detrend
+from config import *
+from utils import design_bandpass
+
+class WelchSpectrumEstimator:
+    # Overlap-hop Welch estimate of the combined signal. Every `hop` new samples
+    # one Hann-windowed segment is transformed and added to a running sum of
+    # periodograms on a fixed frequency grid; segments that fall out of the
+    # buffer window are subtracted again. Between hops nothing is recomputed.
+    def __init__(self, segment_duration=None, hop=None, resolution=None, max_freq=8.0):
+        # Defaults are read from config when constructed, so sweeps can override them
+        self.segment_duration = SPECTRUM_SEGMENT_DURATION if segment_duration is None else segment_duration
+        self.hop = SPECTRUM_HOP if hop is None else hop
+        resolution = SPECTRUM_RESOLUTION if resolution is None else resolution
+        self.freqs = np.arange(0, max_freq + resolution / 2, resolution)
+        self.segments = deque()
+        self.power_sum = np.zeros(len(self.freqs))
+        self.last_time = None
+        self.pending = 0
+        self._gain_key = None
+        self._gain = None
+
+    @property
+    def has_spectrum(self):
+        return len(self.segments) > 0
+
+    def _filter_gain(self, fs):
+        # Power response of the zero-phase bandpass (|H|^2 applied twice)
+        key = round(fs, 1)
+        if key != self._gain_key:
+            sos = design_bandpass(BANDPASS_LOWCUT, BANDPASS_HIGHCUT, key, FILTER_ORDER)
+            _, h = sosfreqz(sos, worN=self.freqs, fs=key)
+            self._gain = np.abs(h) ** 4
+            self._gain_key = key
+        return self._gain
+
+    def update(self, times, signal, fs):
+        if len(times) == 0:
+            return False
+
+        while self.segments and self.segments[0][0] < times[0]:
+            _, power = self.segments.popleft()
+            self.power_sum -= power
+        if not self.segments:
+            self.power_sum[:] = 0
+
+        if self.last_time is None:
+            self.pending += len(times)
+        else:
+            self.pending += len(times) - np.searchsorted(times, self.last_time, side='right')
+        self.last_time = times[-1]
+
+        n = int(round(self.segment_duration * fs))
+        if self.pending < self.hop or n < 16 or len(signal) < n:
+            return False
+        self.pending = 0
+
+        segment = detrend(np.asarray(signal[-n:], dtype=np.float64))
+        segment *= np.hanning(n)
+        nfft = next_fast_len(max(n, int(np.ceil(fs / (self.freqs[1] - self.freqs[0])))))
+        power = np.abs(rfft(segment, nfft)) ** 2
+        power = np.interp(self.freqs, rfftfreq(nfft, 1 / fs), power, right=0)
+        power *= self._filter_gain(fs)
+
+        self.segments.append((times[-n], power))
+        self.power_sum += power
+        return True
+
+    def spectrum(self):
+        mean_power = np.maximum(self.power_sum, 0) / max(1, len(self.segments))
+        return self.freqs, np.sqrt(mean_power)
+
+    def reset(self):
+        self.segments.clear()
+        self.power_sum[:] = 0
+        self.last_time = None
+        self.pending = 0
@@ -0,0 +1,80 @@
+import numpy as np
+from config import *
+from signal_processor import SignalProcessor
+from face_tracker import MotionIndex
+
+class Subject:
+    def __init__(self, subject_id, face_rect, timestamp):
+        self.id = subject_id
+        self.face_rect = face_rect
+        self.last_seen = timestamp
+        self.signal_processor = SignalProcessor()
+        self.motion = MotionIndex()
+        self.last_update_time = None
+        self.countdown_start = None
+        self.countdown_active = False
+
+def rect_iou(rects_a, rects_b):
+    # Pairwise IoU of (x, y, w, h) boxes, shape (len(rects_a), len(rects_b))
+    a = np.asarray(rects_a, dtype=np.float64).reshape(-1, 1, 4)
+    b = np.asarray(rects_b, dtype=np.float64).reshape(1, -1, 4)
+    x1 = np.maximum(a[..., 0], b[..., 0])
+    y1 = np.maximum(a[..., 1], b[..., 1])
+    x2 = np.minimum(a[..., 0] + a[..., 2], b[..., 0] + b[..., 2])
+    y2 = np.minimum(a[..., 1] + a[..., 3], b[..., 1] + b[..., 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    union = a[..., 2] * a[..., 3] + b[..., 2] * b[..., 3] - inter
+    return inter / (union + 1e-10)
+
+class SubjectTracker:
+    def __init__(self, match_iou=SUBJECT_MATCH_IOU, timeout=SUBJECT_TIMEOUT, event_log=None):
+        self.match_iou = match_iou
+        self.timeout = timeout
+        self.event_log = event_log
+        self.subjects = {}
+        self.next_id = 0
+
+    def primary(self):
+        # Lowest id still being tracked; this is the subject shown in the panels
+        if not self.subjects:
+            return None
+        return self.subjects[min(self.subjects)]
+
+    def associate(self, face_rects, timestamp):
+        # Greedy matching: highest IoU pairs first, then nearest centroid within
+        # half a face width for fast movers, otherwise a new subject
+        ids = list(self.subjects)
+        matched = [None] * len(face_rects)
+
+        if ids and face_rects:
+            known = [self.subjects[i].face_rect for i in ids]
+            iou = rect_iou(face_rects, known)
+            centers = np.array([(x + w / 2, y + h / 2) for x, y, w, h in face_rects])
+            known_centers = np.array([(x + w / 2, y + h / 2) for x, y, w, h in known])
+            distance = np.linalg.norm(centers[:, None] - known_centers[None], axis=2)
+            reach = 0.5 * np.array([w for _, _, w, _ in known])[None]
+
+            for score, valid in ((iou, iou >= self.match_iou), (-distance, distance <= reach)):
+                score = np.where(valid, score, -np.inf)
+                for face, column in np.argwhere(np.isfinite(score))[np.argsort(-score[np.isfinite(score)])]:
+                    if matched[face] is None and ids[column] not in matched:
+                        matched[face] = ids[column]
+
+        subjects = []
+        for face_rect, subject_id in zip(face_rects, matched):
+            if subject_id is None:
+                subject_id = self.next_id
+                self.next_id += 1
+                self.subjects[subject_id] = Subject(subject_id, face_rect, timestamp)
+                self.subjects[subject_id].signal_processor.event_log = self.event_log
+                self.subjects[subject_id].signal_processor.source = subject_id
+            subject = self.subjects[subject_id]
+            subject.face_rect = face_rect
+            subject.last_seen = timestamp
+            subjects.append(subject)
+
+        for subject_id in list(self.subjects):
+            if timestamp - self.subjects[subject_id].last_seen > self.timeout:
+                del self.subjects[subject_id]
+
+        return subjects
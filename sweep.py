@@ -0,0 +1,202 @@
+import argparse
+import ast
+import csv
+import glob
+import itertools
+import os
+import sys
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import config
+from config import *
+from session_recorder import SessionReader, record_intensities, replay_samples
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_GRID = {
+    'BUFFER_DURATION': [10, 15],
+    'BANDPASS_LOWCUT': [0.7, 0.8],
+    'FILTER_ORDER': [2, 4],
+    'UPDATE_INTERVAL': [2, 5],
+    'SNR_UPDATE_GATE': [0, 2]
+}
+
+# Set by the pool initializer: views into the shared trace matrix
+_shm = None
+_traces = None
+
+def default_bound_names():
+    # Config names used as default argument values anywhere in the project.
+    # Those defaults are evaluated once at import, so an override never
+    # reaches them
+    names = set()
+    for path in glob.glob(os.path.join(PROJECT_DIR, '*.py')):
+        with open(path, encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+                for default in node.args.defaults + [d for d in node.args.kw_defaults if d is not None]:
+                    names.update(n.id for n in ast.walk(default) if isinstance(n, ast.Name))
+    return names
+
+def parse_grid(specs):
+    # NAME=v1,v2,... with Python literals, e.g. BANDPASS_HIGHCUT=3.0,3.5
+    grid = {}
+    bound = default_bound_names()
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        if not hasattr(config, name):
+            raise ValueError(f"Unknown config parameter: {name}")
+        if name in bound:
+            raise ValueError(f"{name} is bound as a default argument at import time and cannot be swept")
+        grid[name] = [ast.literal_eval(value) for value in values.split(',')]
+    return grid
+
+def apply_overrides(overrides):
+    # Every module took its own copy of the constants with `from config import *`,
+    # so each project module that has the name gets the new value
+    overrides = dict(overrides)
+    if 'BUFFER_DURATION' in overrides and 'BUFFER_CAPACITY' not in overrides:
+        overrides['BUFFER_CAPACITY'] = int(overrides['BUFFER_DURATION'] * 60 * 1.5)
+    for module in list(sys.modules.values()):
+        path = getattr(module, '__file__', None)
+        if path is None or os.path.dirname(os.path.abspath(path)) != PROJECT_DIR:
+            continue
+        for name, value in overrides.items():
+            if hasattr(module, name):
+                setattr(module, name, value)
+
+def load_traces(paths, reference_bpm=None):
+    # All sessions stacked into one (frames, 3 + n_rois * 3) matrix of time,
+    # face found, motion index and the BGR ROI means, plus per-session row ranges
+    # and ground truth, either reference.csv (time,bpm) in the session
+    # directory or a constant reference_bpm
+    blocks, sessions, rois = [], [], None
+    start = 0
+    for path in paths:
+        reader = SessionReader(path)
+        records = reader.records()
+        if rois is None:
+            rois = reader.rois()
+        elif len(reader.rois()) != len(rois):
+            raise ValueError(f"{path}: sessions must share the same ROIs")
+
+        block = np.empty((len(records), 3 + len(rois) * 3))
+        block[:, 0] = records['time']
+        block[:, 1] = records['face'][:, 2] > 0
+        motion = reader.motion(records)
+        block[:, 2] = motion if motion is not None else 0
+        block[:, 3:] = records['mean'].reshape(len(records), -1)
+        blocks.append(block)
+
+        reference = None
+        reference_path = os.path.join(path, 'reference.csv')
+        if os.path.exists(reference_path):
+            reference = np.loadtxt(reference_path, delimiter=',', skiprows=1, ndmin=2)
+        elif reference_bpm is not None:
+            reference = np.array([[0.0, reference_bpm]])
+        sessions.append({'path': path, 'rows': (start, start + len(records)), 'reference': reference})
+        start += len(records)
+
+    return np.concatenate(blocks), sessions, rois
+
+def _init_worker(shm_name, shape, sessions, rois):
+    global _traces, _shm
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    data = np.ndarray(shape, dtype=np.float64, buffer=_shm.buf)
+    _traces = (data, sessions, rois)
+
+def evaluate(overrides, estimate_interval=0.0):
+    apply_overrides(overrides)
+    data, sessions, rois = _traces
+
+    errors, latencies = [], []
+    cpu_time = signal_time = 0.0
+    for session in sessions:
+        start, end = session['rows']
+        block = data[start:end]
+        if len(block) == 0:
+            continue
+        means = block[:, 3:].reshape(len(block), len(rois), 3)
+
+        cpu_start = time.process_time()
+        rows = replay_samples(block[:, 0], record_intensities(means), block[:, 1] > 0, rois,
+                              estimate_interval=estimate_interval, motion=block[:, 2])
+        cpu_time += time.process_time() - cpu_start
+        signal_time += block[-1, 0] - block[0, 0]
+
+        estimated = rows[rows[:, 1] > 0]
+        if len(estimated) == 0:
+            continue
+        latencies.append(estimated[0, 0] - block[0, 0])
+        reference = session['reference']
+        if reference is not None:
+            truth = np.interp(estimated[:, 0], reference[:, 0], reference[:, 1])
+            errors.append(np.abs(estimated[:, 1] - truth))
+
+    errors = np.concatenate(errors) if errors else np.empty(0)
+    return {
+        **overrides,
+        'mae_bpm': float(np.mean(errors)) if len(errors) else None,
+        'p90_error_bpm': float(np.percentile(errors, 90)) if len(errors) else None,
+        'first_bpm_s': float(np.mean(latencies)) if latencies else None,
+        'cpu_ms_per_s': 1000.0 * cpu_time / signal_time if signal_time > 0 else None
+    }
+
+def run_sweep(paths, grid, workers=None, reference_bpm=None, estimate_interval=0.0):
+    data, sessions, rois = load_traces(paths, reference_bpm)
+    names = list(grid)
+    combinations = [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, data.nbytes))
+    try:
+        np.ndarray(data.shape, dtype=np.float64, buffer=shm.buf)[:] = data
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shm.name, data.shape, sessions, rois)) as executor:
+            results = list(executor.map(evaluate, combinations, itertools.repeat(estimate_interval)))
+    finally:
+        shm.close()
+        shm.unlink()
+
+    # Most accurate first, cheapest breaking ties
+    return sorted(results, key=lambda r: (r['mae_bpm'] is None, r['mae_bpm'] or 0, r['cpu_ms_per_s'] or 0))
+
+def main():
+    parser = argparse.ArgumentParser(description="Grid search of DSP parameters over recorded sessions")
+    parser.add_argument('sessions', nargs='+', help="session directories written by SessionRecorder")
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=V1,V2',
+                        help="config parameter and the values to try; repeat for each parameter")
+    parser.add_argument('--reference-bpm', type=float, help="ground truth for sessions without reference.csv")
+    parser.add_argument('--estimate-interval', type=float, default=0.0,
+                        help="seconds between spectrum estimates during replay (0 is every frame, as live)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', default='sweep_results.csv')
+    parser.add_argument('--top', type=int, default=10, help="rows to print")
+    args = parser.parse_args()
+
+    try:
+        grid = parse_grid(args.param) if args.param else DEFAULT_GRID
+    except ValueError as e:
+        parser.error(str(e))
+
+    n_configs = int(np.prod([len(values) for values in grid.values()]))
+    print(f"Evaluating {n_configs} configurations on {len(args.sessions)} session(s) with {args.workers} worker(s)")
+    results = run_sweep(args.sessions, grid, args.workers, args.reference_bpm, args.estimate_interval)
+
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+
+    def fmt(value):
+        return '-' if value is None else f"{value:.2f}" if isinstance(value, float) else str(value)
+    columns = list(results[0])
+    print('  '.join(f"{name:>16s}" for name in columns))
+    for result in results[:args.top]:
+        print('  '.join(f"{fmt(result[name]):>16s}" for name in columns))
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+import os
+from batch import output_paths
+
+def test_same_name_in_different_directories(tmp_path):
+    paths = [str(tmp_path / 'a' / 'clip.mp4'), str(tmp_path / 'b' / 'clip.mp4'), str(tmp_path / 'b' / 'other.avi')]
+    outputs = output_paths(paths, 'out')
+    assert outputs == [os.path.join('out', 'a', 'clip.csv'), os.path.join('out', 'b', 'clip.csv'),
+                       os.path.join('out', 'b', 'other.csv')]
+
+def test_same_stem_with_different_extensions(tmp_path):
+    paths = [str(tmp_path / 'clip.mp4'), str(tmp_path / 'clip.avi'), str(tmp_path / 'solo.mkv')]
+    outputs = output_paths(paths, 'out')
+    assert outputs == [os.path.join('out', 'clip.mp4.csv'), os.path.join('out', 'clip.avi.csv'),
+                       os.path.join('out', 'solo.csv')]
+    assert len(set(outputs)) == len(outputs)
@@ -0,0 +1,88 @@
+import os
+import time
+import numpy as np
+import event_log
+from event_log import EventLog, read_events, FRAME, UPDATE, REJECTED
+
+def _row(wall, bpm):
+    return (wall, wall - 100, 0, UPDATE, bpm, bpm + 1, 90.0, 5.0, np.nan)
+
+def test_npz_round_trip(tmp_path):
+    log = EventLog(str(tmp_path), format='npz')
+    log.update(1.0, 2, 71.0, 70.0, 80.0, 4.0)
+    log.frame(1.1, 2, 70.0, 80.0, 4.0, 0.5)
+    log.flush()
+    log.update(2.0, 3, 73.0, 72.0, 85.0, 6.0)
+    log.close()
+    assert os.listdir(tmp_path) == [os.path.basename(log.path)]
+    assert len(os.listdir(log.path)) == 2
+    assert log.written == 3
+
+    events = read_events(str(tmp_path))
+    np.testing.assert_array_equal(events['time'], [1.0, 1.1, 2.0])
+    np.testing.assert_array_equal(events['source'], [2, 2, 3])
+    np.testing.assert_array_equal(events['kind'], [UPDATE, FRAME, UPDATE])
+    np.testing.assert_array_equal(events['bpm'], [70.0, 70.0, 72.0])
+    assert np.isnan(events['raw_bpm'][1]) and np.isnan(events['motion'][0])
+
+def test_every_flush_is_readable_before_close(tmp_path):
+    log = EventLog(str(tmp_path), flush_interval=0.02, format='npz').start()
+    log.update(1.0, 0, 71.0, 70.0, 80.0, 4.0)
+    deadline = time.time() + 5
+    while len(read_events(str(tmp_path))['wall']) < 1 and time.time() < deadline:
+        time.sleep(0.02)
+    assert len(read_events(str(tmp_path))['wall']) == 1
+    log.update(2.0, 0, 72.0, 71.0, 80.0, 4.0)
+    log.close()
+    np.testing.assert_array_equal(read_events(str(tmp_path))['time'], [1.0, 2.0])
+
+def test_time_range_skips_parts(tmp_path, monkeypatch):
+    base = time.time() - 3600
+    log = EventLog(str(tmp_path), format='npz')
+    for part in range(5):
+        for i in range(10):
+            log.write(_row(base + part * 60 + i, 60 + part))
+        log.flush()
+    log.close()
+
+    opened = []
+    load = np.load
+    monkeypatch.setattr(event_log.np, 'load', lambda path: opened.append(path) or load(path))
+    events = read_events(str(tmp_path), start=base + 125, end=base + 185)
+    np.testing.assert_array_equal(events['wall'], base + np.array([125, 126, 127, 128, 129, 180, 181, 182, 183, 184]))
+    assert len(opened) == 2
+
+def test_concurrent_writers_keep_their_long_parts(tmp_path):
+    # One writer's part spans the range while another process starts parts
+    # in between; pruning must not drop the long one
+    base = time.time() - 3600
+    long_part = EventLog(str(tmp_path), format='npz')
+    short_parts = EventLog(str(tmp_path), format='npz')
+    assert long_part.path != short_parts.path
+    for i in range(0, 600, 10):
+        long_part.write(_row(base + i, 70))
+    long_part.flush()
+    for offset in (100, 200):
+        short_parts.write(_row(base + offset + 5, 80))
+        short_parts.flush()
+    long_part.close()
+    short_parts.close()
+
+    events = read_events(str(tmp_path), start=base + 250, end=base + 300)
+    np.testing.assert_array_equal(events['wall'], base + np.array([250, 260, 270, 280, 290]))
+
+def test_out_of_range_estimates_are_not_updates(tmp_path):
+    from signal_processor import SignalProcessor
+    log = EventLog(str(tmp_path), format='npz')
+    processor = SignalProcessor()
+    processor.event_log = log
+    processor.source = 4
+    for bpm in (72.0, 30.0, 75.0, 200.0):
+        processor.update_bpm(bpm)
+    log.close()
+
+    events = read_events(str(tmp_path))
+    np.testing.assert_array_equal(events['kind'], [UPDATE, REJECTED, UPDATE, REJECTED])
+    np.testing.assert_array_equal(events['raw_bpm'], [72, 30, 75, 200])
+    # A rejected estimate leaves the published BPM where it was
+    np.testing.assert_array_equal(events['bpm'], [72, 72, 73.5, 73.5])
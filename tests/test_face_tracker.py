@@ -0,0 +1,54 @@
+import cv2
+import numpy as np
+from face_tracker import LandmarkTracker, TRACKING_LANDMARKS, similarity_motion
+
+def _points(seed=0):
+    return np.random.default_rng(seed).uniform(200, 300, (len(TRACKING_LANDMARKS), 2))
+
+def test_translation_keeps_scale():
+    points = _points()
+    for offset in ((15, 0), (0, 15), (-7, 22)):
+        shift, scale = similarity_motion(points, points + offset)
+        np.testing.assert_allclose(shift, offset)
+        assert abs(scale - 1) < 1e-6
+
+def test_zoom_about_any_center():
+    points = _points()
+    zoomed = (points - [50, 400]) * 1.2 + [60, 380]
+    _, scale = similarity_motion(points, zoomed)
+    assert abs(scale - 1.2) < 1e-6
+
+def _texture(shift=(0, 0)):
+    rng = np.random.default_rng(1)
+    image = cv2.GaussianBlur(rng.integers(0, 256, (480, 640), dtype=np.uint8), (0, 0), 2)
+    matrix = np.float32([[1, 0, shift[0]], [0, 1, shift[1]]])
+    return cv2.warpAffine(image, matrix, (640, 480), borderMode=cv2.BORDER_REFLECT)
+
+def _face():
+    landmarks = np.random.default_rng(2).uniform([220, 140], [420, 340], (478, 2))
+    return landmarks, (220, 140, 200, 200)
+
+def test_tracked_box_keeps_its_size_under_translation():
+    landmarks, face_rect = _face()
+    for shift in ((6, 0), (0, 6)):
+        tracker = LandmarkTracker(interval=10)
+        tracker.reset(_texture(), [landmarks], [face_rect])
+        rects = tracker.track(_texture(shift))
+        assert rects is not None
+        x, y, w, h = rects[0]
+        assert (w, h) == (200, 200)
+        assert abs(x - (220 + shift[0])) <= 1 and abs(y - (140 + shift[1])) <= 1
+
+def test_polygon_rois_keep_their_area_under_translation():
+    from roi_manager import ROIManager
+    landmarks, face_rect = _face()
+    roi_manager = ROIManager()
+    before = [cv2.contourArea(roi['points'].astype(np.float32)) for roi in roi_manager.get_polygon_rois(landmarks)]
+    for shift in ((6, 0), (0, 6), (4, 4)):
+        tracker = LandmarkTracker(interval=10)
+        tracker.reset(_texture(), [landmarks], [face_rect])
+        assert tracker.track(_texture(shift)) is not None
+        moved = tracker.face_landmarks[0]
+        np.testing.assert_allclose(moved - landmarks, np.broadcast_to(shift, landmarks.shape), atol=1.0)
+        after = [cv2.contourArea(roi['points'].astype(np.float32)) for roi in roi_manager.get_polygon_rois(moved)]
+        np.testing.assert_allclose(after, before, rtol=0.03)
@@ -0,0 +1,32 @@
+from types import SimpleNamespace
+from governor import FrameRateGovernor
+
+def _interval(governor, start, load, snr, fps=30):
+    # One second of video at `fps`, spending `load` seconds in the stages
+    for i in range(fps):
+        governor.admit(start + i / fps)
+    governor.observe('detect', load)
+    governor.update(SimpleNamespace(avg_snr=snr, confidence=snr * 20, current_bpm=70), start + 1.0)
+    return start + 1.0
+
+def test_middling_quality_restores_after_overload():
+    governor = FrameRateGovernor(budget=0.5, interval=1.0, min_rate=5)
+    governor.can_decimate = True
+    t = _interval(governor, 0.0, 0.0, 3.0)
+    for _ in range(12):
+        t = _interval(governor, t, 2.0, 3.0)
+    assert governor.scale > 0 and governor.stride > 1 and governor.cadence > 0
+
+    # SNR short of good, CPU idle: resolution comes back first
+    scale = governor.scale
+    t = _interval(governor, t, 0.05, 3.0)
+    assert governor.scale == scale - 1
+    for _ in range(12):
+        t = _interval(governor, t, 0.05, 3.0)
+    assert (governor.scale, governor.stride, governor.cadence) == (0, 1, 0)
+
+def test_clean_signal_keeps_shedding():
+    governor = FrameRateGovernor(budget=0.5, interval=1.0, min_rate=5)
+    t = _interval(governor, 0.0, 0.0, 6.0)
+    t = _interval(governor, t, 0.05, 6.0)
+    assert governor.cadence == 2 and governor.scale == 0
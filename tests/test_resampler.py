@@ -0,0 +1,57 @@
+import numpy as np
+import signal_processor
+from signal_processor import SignalProcessor
+from utils import UniformResampler
+
+def test_irregular_samples_land_on_the_grid():
+    resampler = UniformResampler(10)
+    times = [0.0, 0.13, 0.21, 0.38, 0.5]
+    grid, values = [], []
+    for t in times:
+        g, v = resampler.push(t, 2 * t)
+        grid.extend(g)
+        values.extend(v)
+    np.testing.assert_allclose(grid, [0.0, 0.1, 0.2, 0.3, 0.4, 0.5])
+    # A linear input stays linear
+    np.testing.assert_allclose(values, 2 * np.array(grid))
+
+def test_long_gap_restarts_instead_of_bridging():
+    resampler = UniformResampler(10, max_gap=5)
+    for t in np.arange(0, 1.05, 0.1):
+        resampler.push(t, 1.0)
+    assert not resampler.restarted
+
+    grid, values = resampler.push(3.0, 5.0)
+    assert resampler.restarted
+    np.testing.assert_array_equal(grid, [3.0])
+    np.testing.assert_array_equal(values, [5.0])
+
+    grid, _ = resampler.push(3.1, 5.0)
+    assert not resampler.restarted
+    np.testing.assert_allclose(grid, [3.1])
+
+def test_short_gap_is_bridged():
+    resampler = UniformResampler(10, max_gap=5)
+    resampler.push(0.0, 0.0)
+    grid, values = resampler.push(0.4, 4.0)
+    assert not resampler.restarted
+    np.testing.assert_allclose(grid, [0.1, 0.2, 0.3, 0.4])
+    np.testing.assert_allclose(values, [1.0, 2.0, 3.0, 4.0])
+
+def test_face_loss_clears_the_uniform_window(monkeypatch):
+    monkeypatch.setattr(signal_processor, 'RESAMPLE_FS', 30)
+    processor = SignalProcessor()
+    rois = [{'weight': 1.0}]
+    for t in np.arange(0, 2, 1 / 30):
+        processor.add_sample(t, [100.0])
+        processor.combine_roi_signals(rois)
+    before = len(processor.uniform)
+    # Face lost for 3 s
+    for t in np.arange(5, 5.5, 1 / 30):
+        processor.add_sample(t, [100.0])
+        processor.combine_roi_signals(rois)
+
+    times = processor.uniform.times
+    assert before >= 59
+    assert times[0] >= 5.0
+    assert np.all(np.diff(times) < 2 / 30)
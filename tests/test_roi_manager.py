@@ -0,0 +1,52 @@
+import os
+import cv2
+import numpy as np
+import pytest
+from roi_manager import ROIManager, _lut_index, build_skin_lut, load_skin_lut
+from config import SKIN_LOWER_YCRCB, SKIN_UPPER_YCRCB, SKIN_LOWER_HSV, SKIN_UPPER_HSV
+
+def _threshold_mask(image):
+    ycrcb = cv2.inRange(cv2.cvtColor(image, cv2.COLOR_BGR2YCrCb),
+                        np.array(SKIN_LOWER_YCRCB, np.uint8), np.array(SKIN_UPPER_YCRCB, np.uint8))
+    hsv = cv2.inRange(cv2.cvtColor(image, cv2.COLOR_BGR2HSV),
+                      np.array(SKIN_LOWER_HSV, np.uint8), np.array(SKIN_UPPER_HSV, np.uint8))
+    return cv2.bitwise_and(ycrcb, hsv)
+
+@pytest.fixture(scope='module')
+def lut():
+    return build_skin_lut(32)
+
+def test_gather_matches_table(lut):
+    manager = ROIManager()
+    manager.set_skin_lut(lut)
+    colors = np.random.default_rng(0).integers(0, 256, (200, 100, 3), dtype=np.uint8)
+    gathered = manager.skin_table.take(_lut_index(colors, 32))
+    b, g, r = (colors // 8).transpose(2, 0, 1)
+    np.testing.assert_array_equal(gathered, lut[b, g, r])
+
+def test_lut_agrees_with_thresholds(lut):
+    manager = ROIManager()
+    manager.set_skin_lut(lut)
+    rng = np.random.default_rng(1)
+    uniform = rng.integers(0, 256, (200, 100, 3), dtype=np.uint8)
+    # Skin-like colors sit near the bounds, where quantization matters
+    skin = np.clip(rng.normal([120, 150, 200], 30, (200, 100, 3)), 0, 255).astype(np.uint8)
+    for colors, rate in ((uniform, 0.98), (skin, 0.94)):
+        agree = manager.skin_table.take(_lut_index(colors, 32)) == _threshold_mask(colors)
+        assert agree.mean() > rate
+
+def test_bins_must_be_power_of_two(tmp_path):
+    for bins in (0, 24, 512):
+        with pytest.raises(ValueError):
+            load_skin_lut(bins, str(tmp_path))
+
+def test_corrupt_cache_is_rebuilt(tmp_path):
+    expected = load_skin_lut(16, str(tmp_path))
+    load_skin_lut.cache_clear()
+    [name] = os.listdir(tmp_path)
+    with open(tmp_path / name, 'wb') as f:
+        f.write(b'\x93NUMPY garbage')
+    rebuilt = load_skin_lut(16, str(tmp_path))
+    np.testing.assert_array_equal(rebuilt, expected)
+    load_skin_lut.cache_clear()
+    np.testing.assert_array_equal(np.load(tmp_path / name), expected)
@@ -0,0 +1,79 @@
+import numpy as np
+from signal_buffer import SignalBuffer
+
+def test_window_is_contiguous_after_wraparound():
+    buffer = SignalBuffer(5, 2)
+    for i in range(12):
+        buffer.append(float(i), (i, 10 * i))
+
+    assert len(buffer) == 5 and buffer.is_full
+    np.testing.assert_array_equal(buffer.times, np.arange(7, 12))
+    np.testing.assert_array_equal(buffer.window(), [np.arange(7, 12), 10 * np.arange(7, 12)])
+    np.testing.assert_array_equal(buffer.latest(), [11, 110])
+    # Views, not copies
+    assert buffer.window().base is not None
+
+def test_drop_and_expired_count():
+    buffer = SignalBuffer(8, 1)
+    for i in range(10):
+        buffer.append(i * 0.5, (i,))
+    # Kept times are 1.0 .. 4.5; those older than 2 s before the latest go
+    assert buffer.expired_count(2.0) == 3
+    buffer.drop(buffer.expired_count(2.0))
+    np.testing.assert_array_equal(buffer.times, [2.5, 3.0, 3.5, 4.0, 4.5])
+
+def test_set_latest_writes_both_copies():
+    buffer = SignalBuffer(3, 2)
+    for i in range(5):
+        buffer.append(float(i), (i,))
+        buffer.set_latest(1, -i)
+    np.testing.assert_array_equal(buffer.channel(1), [-2, -3, -4])
+    # Wrap again so the mirrored copy becomes the live window
+    for i in range(5, 8):
+        buffer.append(float(i), (i,))
+        buffer.set_latest(1, -i)
+    np.testing.assert_array_equal(buffer.window(), [[5, 6, 7], [-5, -6, -7]])
+
+def test_missing_channels_are_zeroed():
+    buffer = SignalBuffer(2, 3)
+    buffer.append(0.0, (1, 2, 3))
+    buffer.append(1.0, (4, 5, 6))
+    buffer.append(2.0, (7,))
+    np.testing.assert_array_equal(buffer.latest(), [7, 0, 0])
+
+def test_interpolate_tail_across_wraparound():
+    buffer = SignalBuffer(5, 2)
+    for i in range(7):
+        buffer.append(float(i), (i * i, 100))
+    # Live window is times 2..6, stored at ring positions 2, 3, 4, 0, 1
+    buffer.interpolate_tail(3, slice(0, 1))
+    np.testing.assert_array_equal(buffer.window(), [[4, 12, 20, 28, 36], [100] * 5])
+    # Both copies were written: shifting the window onto the mirror keeps them
+    for i in range(7, 9):
+        buffer.append(float(i), (0, 0))
+    np.testing.assert_array_equal(buffer.channel(0)[:3], [20, 28, 36])
+
+def test_interpolate_tail_follows_time_not_index():
+    buffer = SignalBuffer(8, 1)
+    for t, value in ((0.0, 0), (1.0, 5), (1.5, 5), (4.0, 8)):
+        buffer.append(t, (value,))
+    buffer.interpolate_tail(2)
+    np.testing.assert_allclose(buffer.channel(0), [0, 2, 3, 8])
+
+def test_interpolate_tail_needs_both_neighbours():
+    buffer = SignalBuffer(4, 1)
+    for i in range(3):
+        buffer.append(float(i), (i * 10 + 1,))
+    buffer.interpolate_tail(2)
+    buffer.interpolate_tail(0)
+    np.testing.assert_array_equal(buffer.channel(0), [1, 11, 21])
+
+def test_set_tail_across_wraparound():
+    buffer = SignalBuffer(4, 2)
+    for i in range(6):
+        buffer.append(float(i), (i, i))
+    buffer.set_tail(0, np.array([-3, -4, -5]))
+    np.testing.assert_array_equal(buffer.window(), [[2, -3, -4, -5], [2, 3, 4, 5]])
+    for i in range(6, 8):
+        buffer.append(float(i), (i, i))
+    np.testing.assert_array_equal(buffer.channel(0), [-4, -5, 6, 7])
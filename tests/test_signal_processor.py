@@ -0,0 +1,97 @@
+import numpy as np
+import signal_processor
+from face_tracker import MotionIndex, TRACKING_LANDMARKS, landmark_motion
+from signal_processor import SignalProcessor, calculate_heart_rates
+
+FS = 30.0
+ROIS = [{'weight': 1.0}, {'weight': 1.0}]
+
+def _feed(processor, t, value, motion=0.0):
+    processor.add_sample(t, [value, value], motion)
+    processor.update_roi_weights(ROIS)
+    processor.combine_roi_signals(ROIS)
+    processor.cleanup_buffers()
+
+def _clean(t):
+    return 100 + np.sin(2 * np.pi * 1.2 * t)
+
+def test_landmark_motion_is_in_face_widths_per_second():
+    rng = np.random.default_rng(0)
+    base = rng.uniform(0, 200, (478, 2))
+    frames = [base + [3 * i, 0] for i in range(4)]
+    motion = landmark_motion(frames, [150] * 4, [0.0, 0.1, 0.2, 0.3])
+    np.testing.assert_allclose(motion, [0, 0.2, 0.2, 0.2])
+    # Twice as close and twice the frame rate reads the same
+    motion = landmark_motion([2 * f for f in frames], [300] * 4, [0.0, 0.05, 0.1, 0.15])
+    np.testing.assert_allclose(motion[1:], 0.4)
+
+def test_motion_index_matches_batch():
+    rng = np.random.default_rng(1)
+    frames = [rng.uniform(0, 200, (478, 2)) for _ in range(5)]
+    times = np.arange(5) / FS
+    index = MotionIndex()
+    live = [index.update(frame, (0, 0, 120, 120), t) for frame, t in zip(frames, times)]
+    np.testing.assert_allclose(live, landmark_motion(frames, [120] * 5, times))
+    assert TRACKING_LANDMARKS.max() < 478
+
+def test_motion_run_is_held_then_interpolated():
+    processor = SignalProcessor()
+    times = np.arange(120) / FS
+    for t in times[:100]:
+        _feed(processor, t, _clean(t))
+    # One flagged frame holds it and every frame within MOTION_HOLD after it
+    spike_times = times[100:103]
+    for t in spike_times:
+        _feed(processor, t, 500.0, motion=5.0 if t == spike_times[0] else 0.0)
+        assert processor.motion_blocked()
+        np.testing.assert_array_equal(processor.buffer.latest()[:2], processor.buffer.window()[:2, 99])
+    assert processor.motion_run == 3
+    assert calculate_heart_rates([processor]) == [(None, None, None, None)]
+
+    clean_time = times[100] + signal_processor.MOTION_HOLD + 1e-3
+    _feed(processor, clean_time, _clean(clean_time))
+    assert processor.motion_run == 0
+    held = processor.buffer.times[-5:]
+    combined = processor.combined_signal[-5:]
+    expected = np.interp(held, held[[0, -1]], combined[[0, -1]])
+    np.testing.assert_allclose(combined, expected, rtol=1e-5)
+    assert list(processor.motion_times) == list(spike_times)
+
+def test_motion_times_leave_with_the_buffer():
+    processor = SignalProcessor()
+    t = 0.0
+    for i in range(60):
+        _feed(processor, t, _clean(t), motion=5.0 if i == 30 else 0.0)
+        t += 1 / FS
+    assert len(processor.motion_times) > 0
+    while t < 30 + signal_processor.BUFFER_DURATION:
+        _feed(processor, t, _clean(t))
+        t += 1 / FS
+    assert len(processor.motion_times) == 0
+    assert not processor.motion_blocked()
+
+def test_mostly_interpolated_window_blocks_estimates(monkeypatch):
+    monkeypatch.setattr(signal_processor, 'MOTION_MAX_FRACTION', 0.05)
+    processor = SignalProcessor()
+    t = 0.0
+    for i in range(150):
+        _feed(processor, t, _clean(t), motion=5.0 if 60 <= i < 75 else 0.0)
+        t += 1 / FS
+    assert processor.motion_run == 0
+    assert processor.motion_blocked()
+    assert processor.calculate_heart_rate(FS)[0] is None
+
+def test_resampled_grid_is_bridged_too(monkeypatch):
+    monkeypatch.setattr(signal_processor, 'RESAMPLE_FS', 20)
+    processor = SignalProcessor()
+    t = 0.0
+    for i in range(90):
+        # A ramp, so the bridge has to follow it rather than stay flat
+        _feed(processor, t, 100 + 3 * t + (400 if 60 <= i < 70 else 0), motion=5.0 if 60 <= i < 62 else 0.0)
+        t += 1 / FS
+    times, combined = processor.uniform.times, processor.uniform.channel(0)
+    bridge = (times > 59 / FS) & (times <= 69 / FS)
+    assert bridge.sum() >= 6
+    # ROI weights exist from the eleventh sample on
+    settled = times > 0.5
+    np.testing.assert_allclose(combined[settled], 100 + 3 * times[settled], atol=0.05)
@@ -0,0 +1,52 @@
+import numpy as np
+from scipy.signal import welch
+from spectral_estimator import WelchSpectrumEstimator
+
+FS = 32.0
+
+def _signal(seconds=30, bpm=75, seed=0):
+    t = np.arange(int(seconds * FS)) / FS
+    noise = np.random.default_rng(seed).normal(0, 0.3, len(t))
+    return t, np.sin(2 * np.pi * bpm / 60 * t) + 0.5 * t + noise
+
+def _feed(estimator, t, x, hop):
+    # The window grows by `hop` samples per call, as the buffer does between estimates
+    for end in range(hop, len(t) + 1, hop):
+        estimator.update(t[:end], x[:end], FS)
+
+def _direct(estimator, x, n, hop):
+    # Same segments, window and detrending as the running sum, one-sided
+    # density rescaled to the estimator's plain |FFT|^2 and filter response
+    window = np.hanning(n)
+    freqs, psd = welch(x, FS, window=window, noverlap=n - hop, detrend='linear', nfft=n)
+    psd = psd * FS * np.sum(window ** 2) / 2
+    psd[0] *= 2
+    k = len(estimator.freqs)
+    assert len(estimator.segments) == (len(x) - n) // hop + 1
+    np.testing.assert_allclose(freqs[:k], estimator.freqs)
+    return np.sqrt(psd[:k] * estimator._filter_gain(FS))
+
+def test_running_sum_matches_welch():
+    # 8 s segments at 32 Hz put the FFT bins exactly on the 0.125 Hz grid
+    n, hop = 256, 32
+    estimator = WelchSpectrumEstimator(segment_duration=n / FS, hop=hop, resolution=FS / n)
+    t, x = _signal()
+    _feed(estimator, t, x, hop)
+    freqs, amplitude = estimator.spectrum()
+
+    expected = _direct(estimator, x, n, hop)
+    np.testing.assert_allclose(amplitude, expected, rtol=1e-6, atol=1e-9 * expected.max())
+    band = (freqs >= 0.7) & (freqs <= 3.5)
+    assert freqs[band][np.argmax(amplitude[band])] == 1.25
+
+def test_segments_leaving_the_window_are_subtracted():
+    n, hop = 256, 32
+    estimator = WelchSpectrumEstimator(segment_duration=n / FS, hop=hop, resolution=FS / n)
+    t, x = _signal(bpm=90, seed=1)
+    _feed(estimator, t, x, hop)
+    # Drop the oldest three hops; no new samples, so only subtraction happens
+    estimator.update(t[3 * hop:], x[3 * hop:], FS)
+    _, amplitude = estimator.spectrum()
+
+    expected = _direct(estimator, x[3 * hop:], n, hop)
+    np.testing.assert_allclose(amplitude, expected, rtol=1e-6, atol=1e-6 * expected.max())
@@ -0,0 +1,72 @@
+import copy
+import numpy as np
+from signal_processor import SignalProcessor, calculate_heart_rates
+from subject_tracker import SubjectTracker, rect_iou
+
+def test_rect_iou():
+    iou = rect_iou([(0, 0, 10, 10), (100, 100, 10, 10)], [(5, 0, 10, 10), (0, 0, 10, 10)])
+    np.testing.assert_allclose(iou, [[50 / 150, 1.0], [0.0, 0.0]])
+
+def test_faces_keep_their_subject_when_order_changes():
+    tracker = SubjectTracker(match_iou=0.3, timeout=2.0)
+    first = tracker.associate([(0, 0, 100, 100), (300, 0, 100, 100)], 0.0)
+    ids = [subject.id for subject in first]
+    # Reported in the opposite order and slightly moved
+    second = tracker.associate([(305, 5, 100, 100), (4, 2, 100, 100)], 0.1)
+    assert [subject.id for subject in second] == ids[::-1]
+    assert second[0].signal_processor is first[1].signal_processor
+
+def test_fast_mover_matched_by_centroid():
+    tracker = SubjectTracker(match_iou=0.3, timeout=2.0)
+    subject = tracker.associate([(0, 0, 100, 100)], 0.0)[0]
+    # Too little overlap left, but within half a face width
+    moved = tracker.associate([(35, 35, 100, 100)], 0.1)[0]
+    assert rect_iou([(0, 0, 100, 100)], [(35, 35, 100, 100)])[0, 0] < 0.3
+    assert moved is subject
+
+def test_new_face_and_timeout():
+    tracker = SubjectTracker(match_iou=0.3, timeout=2.0)
+    a = tracker.associate([(0, 0, 100, 100)], 0.0)[0]
+    b = tracker.associate([(0, 0, 100, 100), (500, 0, 100, 100)], 1.0)[1]
+    assert b.id != a.id and tracker.primary() is a
+    tracker.associate([(500, 0, 100, 100)], 3.5)
+    assert list(tracker.subjects) == [b.id]
+
+def _subject(fs, seconds, bpm, seed):
+    rng = np.random.default_rng(seed)
+    processor = SignalProcessor()
+    rois = [{'weight': 1.0}]
+    for t in np.arange(0, seconds, 1 / fs):
+        value = 100 + np.sin(2 * np.pi * bpm / 60 * t) + rng.normal(0, 0.2)
+        processor.add_sample(t, [value])
+        processor.update_roi_weights(rois)
+        processor.combine_roi_signals(rois)
+        processor.cleanup_buffers()
+    return processor
+
+def test_batched_estimates_match_single_subject():
+    # Different frame rates and window lengths in one call
+    processors = [_subject(30, 12, 72, 0), _subject(24, 10, 90, 1), _subject(30, 8, 60, 2), _subject(30, 12, 66, 3)]
+    singles = [copy.deepcopy(p) for p in processors]
+
+    batched = calculate_heart_rates(processors)
+    for processor, single, (bpm, filtered, freqs, spectrum) in zip(processors, singles, batched):
+        expected = single.calculate_heart_rate(single.analysis_fs())
+        assert bpm == expected[0]
+        np.testing.assert_allclose(filtered, expected[1])
+        np.testing.assert_allclose(freqs, expected[2])
+        np.testing.assert_allclose(spectrum, expected[3], atol=1e-9)
+        assert processor.avg_snr == single.avg_snr
+
+def test_resampled_cameras_share_one_batch(monkeypatch):
+    # Independent frame rates land on the same grid and window length
+    import signal_processor
+    monkeypatch.setattr(signal_processor, 'RESAMPLE_FS', 30)
+    processors = [_subject(fs, 16, 72, seed) for seed, fs in enumerate((25, 29.97, 24))]
+    filter_calls = []
+    bandpass = signal_processor.butter_bandpass_filter
+    monkeypatch.setattr(signal_processor, 'butter_bandpass_filter',
+                        lambda data, *args, **kwargs: filter_calls.append(np.shape(data)) or bandpass(data, *args, **kwargs))
+    estimates = calculate_heart_rates(processors)
+    assert len(filter_calls) == 1 and filter_calls[0][0] == 3
+    assert all(estimate[0] is not None for estimate in estimates)
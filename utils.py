@@ -1,15 +1,114 @@
 import cv2
+import threading
 import numpy as np
-from scipy.signal import butter, filtfilt
-from scipy.fft import fft, fftfreq
+from functools import lru_cache
 from config import *  # ADD THIS IMPORT
 
-def butter_bandpass_filter(data, lowcut, highcut, fs, order=4):
+# scipy.signal and scipy.fft are imported where they are used: together they
+# take over a second to load, which live capture hides behind the first frames
+# with preload_dsp()
+_dsp_preload = None
+
+def _import_dsp():
+    import scipy.fft
+    import scipy.signal
+
+def preload_dsp():
+    # Starts loading the SciPy DSP modules on a daemon thread, once per process;
+    # batch tools skip it and import on the first estimate instead
+    global _dsp_preload
+    if _dsp_preload is None:
+        _dsp_preload = threading.Thread(target=_import_dsp, name='dsp-preload', daemon=True)
+        _dsp_preload.start()
+    return _dsp_preload
+
+@lru_cache(maxsize=64)
+def _bandpass_sos(lowcut, highcut, fs, order):
+    from scipy.signal import butter
     nyq = 0.5 * fs
     low = lowcut / nyq
     high = highcut / nyq
-    b, a = butter(order, [low, high], btype='band')
-    return filtfilt(b, a, data)
+    return butter(order, [low, high], btype='band', output='sos')
+
+def design_bandpass(lowcut, highcut, fs, order=4):
+    # fs is quantized so the per-frame estimate hits the design cache
+    return _bandpass_sos(lowcut, highcut, round(fs, 1), order)
+
+def butter_bandpass_filter(data, lowcut, highcut, fs, order=4, axis=-1):
+    from scipy.signal import sosfiltfilt
+    sos = design_bandpass(lowcut, highcut, fs, order)
+    return sosfiltfilt(sos, data, axis=axis)
+
+class StreamingBandpassFilter:
+    def __init__(self, lowcut, highcut, order=4, fs_tolerance=None):
+        self.lowcut = lowcut
+        self.highcut = highcut
+        self.order = order
+        self.fs_tolerance = FILTER_FS_TOLERANCE if fs_tolerance is None else fs_tolerance
+        self.fs = None
+        self.sos = None
+        self.zi = None
+    
+    def process(self, samples, fs):
+        from scipy.signal import sosfilt, sosfilt_zi
+        samples = np.asarray(samples, dtype=np.float64)
+        if len(samples) == 0:
+            return samples
+        
+        if self.sos is None or abs(fs - self.fs) > self.fs_tolerance * self.fs:
+            # Redesign and restart from steady state at the current level so
+            # the DC offset does not ring through the new filter
+            self.fs = fs
+            self.sos = design_bandpass(self.lowcut, self.highcut, fs, self.order)
+            self.zi = sosfilt_zi(self.sos) * samples[0]
+        
+        filtered, self.zi = sosfilt(self.sos, samples, zi=self.zi)
+        return filtered
+    
+    def reset(self):
+        self.fs = None
+        self.sos = None
+        self.zi = None
+
+class UniformResampler:
+    # Linear interpolation of an irregular (timestamp, value) stream onto a
+    # fixed-rate grid; each push emits only the grid points the new sample covers.
+    # A gap longer than max_gap grid periods (a lost face) is not bridged: the
+    # grid restarts at the new sample and `restarted` is set for the caller.
+    def __init__(self, fs, max_gap=None):
+        self.fs = fs
+        self.max_gap = RESAMPLE_MAX_GAP if max_gap is None else max_gap
+        self.grid_time = None
+        self.prev_time = None
+        self.prev_value = None
+        self.restarted = False
+    
+    def push(self, timestamp, value):
+        self.restarted = False
+        if self.prev_time is not None and (timestamp - self.prev_time) * self.fs > self.max_gap:
+            self.reset()
+            self.restarted = True
+        if self.grid_time is None:
+            grid = np.array([timestamp], dtype=np.float64)
+            values = np.array([value], dtype=np.float64)
+        else:
+            # The epsilon keeps a grid point that falls on the sample itself
+            n = int((timestamp - self.grid_time) * self.fs + 1e-6)
+            if n > 0:
+                grid = self.grid_time + np.arange(1, n + 1) / self.fs
+                values = np.interp(grid, (self.prev_time, timestamp), (self.prev_value, value))
+            else:
+                grid = values = np.empty(0)
+        
+        if len(grid) > 0:
+            self.grid_time = grid[-1]
+        self.prev_time, self.prev_value = timestamp, value
+        return grid, values
+    
+    def reset(self):
+        self.grid_time = None
+        self.prev_time = None
+        self.prev_value = None
 
 def normalize_signal(signal):
     signal = np.array(signal)
@@ -17,14 +116,45 @@ def normalize_signal(signal):
         return signal
     return (signal - np.mean(signal)) / (np.std(signal) + 1e-10)
 
-def calculate_snr(signal, fs):
-    if len(signal) < 10:
-        return 0
-        
-    N = len(signal)
-    freqs = fftfreq(N, 1/fs)
-    fft_vals = np.abs(fft(signal))
+def compute_spectrum(signal, fs, axis=-1, n=None):
+    # n > len(signal) zero-pads for a finer frequency grid
+    from scipy.fft import rfft, rfftfreq
+    N = n if n is not None else np.shape(signal)[axis]
+    freqs = rfftfreq(N, 1/fs)
+    fft_vals = np.abs(rfft(signal, n=N, axis=axis))
+    return freqs, fft_vals
+
+def chrominance_pulse(rgb, fs, method='pos', window=None):
+    # rgb: (3, N) skin color means in R, G, B order. Every window of `window`
+    # seconds is normalized by its own mean, projected onto the plane
+    # orthogonal to skin tone (POS, Wang et al. 2017) or onto the CHROM
+    # chrominance axes (de Haan & Jeanne 2013), tuned so specular and motion
+    # components cancel, and overlap-added into one pulse trace of length N.
+    window = CHROMINANCE_WINDOW if window is None else window
+    rgb = np.asarray(rgb, dtype=np.float64)
+    N = rgb.shape[1]
+    l = min(N, max(2, int(round(window * fs))))
+    
+    windows = np.lib.stride_tricks.sliding_window_view(rgb, l, axis=1)
+    normalized = windows / (windows.mean(axis=2, keepdims=True) + 1e-10)
+    r, g, b = normalized
     
+    if method == 'chrom':
+        x = 3 * r - 2 * g
+        y = 1.5 * r + g - 1.5 * b
+        alpha = x.std(axis=1, keepdims=True) / (y.std(axis=1, keepdims=True) + 1e-10)
+        h = (x - alpha * y) * np.hanning(l)
+    else:
+        s1 = g - b
+        s2 = g + b - 2 * r
+        alpha = s1.std(axis=1, keepdims=True) / (s2.std(axis=1, keepdims=True) + 1e-10)
+        h = s1 + alpha * s2
+    h -= h.mean(axis=1, keepdims=True)
+    
+    index = np.arange(h.shape[0])[:, None] + np.arange(l)[None]
+    return np.bincount(index.ravel(), weights=h.ravel(), minlength=N)
+
+def spectrum_snr(freqs, fft_vals):
     hr_band = np.where((freqs >= 0.7) & (freqs <= 4.0))
     if len(hr_band[0]) == 0:
         return 0
@@ -34,4 +164,32 @@ def calculate_snr(signal, fs):
     noise_band2 = np.where((freqs > 4.0) & (freqs <= 8.0))
     noise_power = np.sum(fft_vals[noise_band1] ** 2) + np.sum(fft_vals[noise_band2] ** 2)
     
-    return 10 * np.log10(signal_power / (noise_power + 1e-10))
\ No newline at end of file
+    return 10 * np.log10(signal_power / (noise_power + 1e-10))
+
+@lru_cache(maxsize=32)
+def snr_band_masks(N, fs):
+    from scipy.fft import rfftfreq
+    freqs = rfftfreq(N, 1/fs)
+    hr_band = (freqs >= 0.7) & (freqs <= 4.0)
+    noise_band = ((freqs >= 0.1) & (freqs < 0.7)) | ((freqs > 4.0) & (freqs <= 8.0))
+    return hr_band, noise_band
+
+def calculate_snr_batch(signals, fs):
+    # calculate_snr for every row of a signals x samples matrix in one rfft
+    from scipy.fft import rfft
+    hr_band, noise_band = snr_band_masks(signals.shape[1], round(fs, 1))
+    if not np.any(hr_band):
+        return np.zeros(len(signals))
+    
+    power = np.abs(rfft(signals, axis=1)) ** 2
+    signal_power = power[:, hr_band].sum(axis=1)
+    noise_power = power[:, noise_band].sum(axis=1)
+    
+    return 10 * np.log10(signal_power / (noise_power + 1e-10))
+
+def calculate_snr(signal, fs):
+    if len(signal) < 10:
+        return 0
+    
+    freqs, fft_vals = compute_spectrum(signal, fs)
+    return spectrum_snr(freqs, fft_vals)
\ No newline at end of file
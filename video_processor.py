@@ -1,6 +1,33 @@
 import cv2
 import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+import config
 from config import *
+from face_tracker import LandmarkTracker, MotionIndex
+from governor import FrameRateGovernor
+from signal_processor import calculate_heart_rates
+from utils import preload_dsp
+
+def draw_label(frame, text, x1, x2, y, font_scale, color, thickness=1):
+    # Left-aligns text with the on-screen left edge of the span [x1, x2). With
+    # MIRROR_MODE 'display' the frame is flipped only when shown, so the text is
+    # drawn mirrored at the mirrored position and reads normally on screen.
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    if MIRROR_MODE != 'display':
+        cv2.putText(frame, text, (x1, y), font, font_scale, color, thickness)
+        return
+    
+    h, w = frame.shape[:2]
+    (text_width, text_height), baseline = cv2.getTextSize(text, font, font_scale, thickness)
+    screen_x = w - x2
+    px1, px2 = max(0, w - screen_x - text_width - 2), min(w, w - screen_x + 2)
+    py1, py2 = max(0, y - text_height - 2), min(h, y + baseline + 2)
+    if px2 <= px1 or py2 <= py1:
+        return
+    patch = cv2.flip(frame[py1:py2, px1:px2], 1)
+    cv2.putText(patch, text, (screen_x - (w - px2), y - py1), font, font_scale, color, thickness)
+    frame[py1:py2, px1:px2] = cv2.flip(patch, 1)
 
 class VideoProcessor:
     def __init__(self):
@@ -9,93 +36,273 @@ class VideoProcessor:
         self.countdown_start = None
         self.countdown_active = False
         self.last_update_time = None
+        self.tracker = LandmarkTracker() if LANDMARK_TRACKING else None
+        self.governor = FrameRateGovernor() if GOVERNOR_ENABLED else None
+        self.motion = MotionIndex()
+        self.face_landmarks = []
+        self.last_stats = []
+        self.recorder = None
+        self.last_faces = []
+    
+    def initialize_camera(self, source=0, max_faces=1):
+        # MediaPipe import and model load overlap with opening the device
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            face_mesh = executor.submit(self.create_face_mesh, max_faces=max_faces)
+            try:
+                self.open_source(source)
+            except Exception:
+                # The caller never gets the FaceMesh, so close it here
+                if not face_mesh.cancel() and face_mesh.exception() is None:
+                    face_mesh.result().close()
+                raise
+            self.face_mesh = face_mesh.result()
+        # SciPy is first needed once the buffer holds enough samples, so it
+        # loads while the first frames go through FaceMesh
+        preload_dsp()
+        
+        return self.face_mesh
     
-    def initialize_camera(self):
-        self.cap = cv2.VideoCapture(0)
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
-        self.cap.set(cv2.CAP_PROP_FPS, CAMERA_FPS)
+    def open_source(self, source=0):
+        self.cap = cv2.VideoCapture(source)
+        if isinstance(source, int):
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
+            self.cap.set(cv2.CAP_PROP_FPS, CAMERA_FPS)
         
         if not self.cap.isOpened():
-            raise Exception("Error: Camera not detected.")
+            if isinstance(source, int):
+                raise Exception("Error: Camera not detected.")
+            raise Exception(f"Error: Could not open video source {source}.")
         
-        self.face_mesh = mp_face_mesh.FaceMesh(
-            static_image_mode=False,
-            max_num_faces=1,
+        return self.cap
+    
+    def create_face_mesh(self, static_image_mode=False, max_faces=1):
+        # One face unless the caller keeps a SignalProcessor per subject
+        # (process_subjects with a SubjectTracker); process_frame and the
+        # single-stream paths feed every face they get into one trace
+        return config.mp_face_mesh.FaceMesh(
+            static_image_mode=static_image_mode,
+            max_num_faces=max_faces,
             refine_landmarks=True,
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5
         )
-        
-        return self.face_mesh
     
-    def process_frame(self, frame, roi_manager, signal_processor, visualization):
-        current_rois = []
-        frame = cv2.flip(frame, 1)
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    def detect_faces(self, frame):
+        if MIRROR_MODE == 'frame':
+            frame = cv2.flip(frame, 1)
+        
+        gray = None
+        if self.tracker is not None:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            face_rects = self.tracker.track(gray)
+            if face_rects is not None:
+                self.face_landmarks = self.tracker.face_landmarks
+                return frame, face_rects
+        
+        # Landmarks come back normalized, so a downsized input maps straight back
+        inference_frame = frame
+        scale = self.governor.inference_scale if self.governor is not None else INFERENCE_SCALE
+        if scale != 1:
+            inference_frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        rgb_frame = cv2.cvtColor(inference_frame, cv2.COLOR_BGR2RGB)
         results = self.face_mesh.process(rgb_frame)
         
+        h, w = frame.shape[:2]
+        face_rects = []
+        self.face_landmarks = []
         if results.multi_face_landmarks:
             for face_landmarks in results.multi_face_landmarks:
-                h, w = frame.shape[:2]
-                landmark_points = [(int(lm.x * w), int(lm.y * h)) for lm in face_landmarks.landmark]
+                landmark_points = np.array([(lm.x, lm.y) for lm in face_landmarks.landmark]) * (w, h)
                 
-                if landmark_points:
-                    xs, ys = zip(*landmark_points)
-                    x_min, x_max, y_min, y_max = min(xs), max(xs), min(ys), max(ys)
-                    face_width, face_height = x_max - x_min, y_max - y_min
-                    
-                    current_rois = roi_manager.get_three_main_rois((x_min, y_min, face_width, face_height))
-                    current_time = time.time()
-                    signal_processor.timestamps.append(current_time)
-                    
-                    for i, roi_info in enumerate(current_rois):
-                        intensity, quality, _ = roi_manager.extract_roi_signal(frame, roi_info)
-                        
-                        if i not in signal_processor.roi_signals:
-                            signal_processor.roi_signals[i] = []
-                        signal_processor.roi_signals[i].append(intensity)
-                        
-                        color = roi_info['color']
-                        cv2.rectangle(frame, (roi_info['x1'], roi_info['y1']), 
-                                    (roi_info['x2'], roi_info['y2']), color, 2)
-                        cv2.putText(frame, roi_info['name'], (roi_info['x1'], roi_info['y1']-5), 
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
-                    
-                    signal_processor.update_roi_weights(current_rois)
-                    combined_signal = signal_processor.combine_roi_signals(current_rois)
-                    
-                    visualization.graph_signals['raw'].append(combined_signal)
-                    if len(visualization.graph_signals['raw']) > 100:
-                        visualization.graph_signals['raw'].pop(0)
-                    
-                    cv2.rectangle(frame, (x_min, y_min), (x_max, y_max), (255, 0, 0), 2)
-                    signal_processor.cleanup_buffers()
-                    
-                    if len(signal_processor.roi_signals['combined']) > 45:
-                        elapsed_time = signal_processor.timestamps[-1] - signal_processor.timestamps[0]
-                        fs = len(signal_processor.roi_signals['combined']) / elapsed_time if elapsed_time > 0 else 30
-                        
-                        bpm, filtered, freqs, fft_values = signal_processor.calculate_heart_rate(fs)
-                        
-                        if bpm is not None:
-                            visualization.graph_signals['filtered'] = filtered.tolist()[-100:]
-                            visualization.graph_signals['freqs'] = freqs
-                            visualization.graph_signals['fft'] = fft_values
-                            
-                            current_time = time.time()
-                            if self.last_update_time is None:
-                                signal_processor.update_bpm(bpm)
-                                self.last_update_time = current_time
-                                self.countdown_start = current_time
-                                self.countdown_active = True
-                            elif (current_time - self.last_update_time) >= UPDATE_INTERVAL:
-                                if signal_processor.avg_snr > 2:
-                                    signal_processor.update_bpm(bpm)
-                                    self.last_update_time = current_time
-                                    self.countdown_start = current_time
-                                else:
-                                    signal_processor.confidence = max(0, signal_processor.confidence - 10)
+                if len(landmark_points) > 0:
+                    x_min, y_min = landmark_points.min(axis=0).astype(int)
+                    x_max, y_max = landmark_points.max(axis=0).astype(int)
+                    face_rects.append((int(x_min), int(y_min), int(x_max - x_min), int(y_max - y_min)))
+                    self.face_landmarks.append(landmark_points)
+        
+        if self.tracker is not None:
+            self.tracker.reset(gray, self.face_landmarks, face_rects)
+        
+        return frame, face_rects
+    
+    def extract_signals(self, frame, face_rect, roi_manager, draw=True, landmarks=None):
+        x_min, y_min, face_width, face_height = face_rect
+        if ROI_MODE == 'polygon' and landmarks is not None:
+            current_rois = roi_manager.get_polygon_rois(landmarks)
+            stats = roi_manager.extract_polygon_signals(frame, current_rois)
+        else:
+            current_rois = roi_manager.get_three_main_rois(face_rect)
+            stats = roi_manager.extract_roi_signals(frame, current_rois)
+        if SIGNAL_METHOD == 'green':
+            intensities = [mean[1] for mean, std, skin_pixels in stats]
+        else:
+            # One R, G, B row per ROI for the chrominance engine
+            intensities = np.array([mean[::-1] for mean, std, skin_pixels in stats])
+        self.last_stats = stats
+        
+        if draw:
+            self.draw_rois(frame, face_rect, current_rois)
+        return current_rois, intensities
+    
+    def draw_rois(self, frame, face_rect, current_rois):
+        x_min, y_min, face_width, face_height = face_rect
+        for roi_info in current_rois:
+            color = roi_info['color']
+            if 'points' in roi_info:
+                cv2.polylines(frame, [roi_info['points']], True, color, 2)
+            else:
+                cv2.rectangle(frame, (roi_info['x1'], roi_info['y1']), 
+                            (roi_info['x2'], roi_info['y2']), color, 2)
+            draw_label(frame, roi_info['name'], roi_info['x1'], roi_info['x2'], roi_info['y1']-5, 0.5, color)
+        
+        cv2.rectangle(frame, (x_min, y_min), (x_min + face_width, y_min + face_height), (255, 0, 0), 2)
+    
+    def skip_frame(self, frame):
+        # Frame decimated by the governor: shown with the last ROIs, not processed
+        if MIRROR_MODE == 'frame':
+            frame = cv2.flip(frame, 1)
+        for face_rect, current_rois in self.last_faces:
+            self.draw_rois(frame, face_rect, current_rois)
+        current_rois = self.last_faces[-1][1] if self.last_faces else []
+        return frame, current_rois
+    
+    def estimate_due(self, signal_processor, timestamp):
+        if len(signal_processor.timestamps) <= 45:
+            return False
+        return self.governor is None or self.governor.estimate_due(timestamp)
+    
+    def ingest_sample(self, signal_processor, visualization, current_rois, intensities, timestamp, motion=0.0):
+        signal_processor.add_sample(timestamp, intensities, motion)
+        signal_processor.update_roi_weights(current_rois)
+        combined_signal = signal_processor.combine_roi_signals(current_rois)
+        
+        if visualization is not None:
+            visualization.graph_signals['raw'].append(combined_signal)
+            if len(visualization.graph_signals['raw']) > 100:
+                visualization.graph_signals['raw'].pop(0)
+        
+        signal_processor.cleanup_buffers()
+    
+    def apply_estimate(self, signal_processor, visualization, estimate, fs, timestamp, state=None):
+        # state carries the BPM update cadence; per-subject callers pass their own
+        state = state if state is not None else self
+        bpm, filtered, freqs, fft_values = estimate
+        
+        if bpm is not None:
+            if visualization is not None:
+                visualization.graph_signals['filtered'] = signal_processor.display_signal(filtered, fs).tolist()
+                visualization.graph_signals['freqs'] = freqs
+                visualization.graph_signals['fft'] = fft_values
+            
+            # Sample time rather than wall time, so recorded video runs on its own clock
+            current_time = timestamp
+            if state.last_update_time is None:
+                signal_processor.update_bpm(bpm)
+                state.last_update_time = current_time
+                state.countdown_start = current_time
+                state.countdown_active = True
+            elif (current_time - state.last_update_time) >= UPDATE_INTERVAL:
+                if signal_processor.avg_snr > SNR_UPDATE_GATE:
+                    signal_processor.update_bpm(bpm)
+                    state.last_update_time = current_time
+                    state.countdown_start = current_time
+                else:
+                    signal_processor.confidence = max(0, signal_processor.confidence - 10)
+    
+    def estimate_subjects(self, signal_processors):
+        # Batched estimate for process_subjects, a method so it can be timed per instance
+        return calculate_heart_rates(signal_processors)
+    
+    def update_signals(self, signal_processor, visualization, current_rois, intensities, timestamp, motion=0.0):
+        self.ingest_sample(signal_processor, visualization, current_rois, intensities, timestamp, motion)
+        
+        if self.estimate_due(signal_processor, timestamp):
+            fs = signal_processor.analysis_fs()
+            estimate = signal_processor.calculate_heart_rate(fs)
+            self.apply_estimate(signal_processor, visualization, estimate, fs, timestamp)
+    
+    def record(self, timestamp, face_rect=None, rois=(), landmarks=None):
+        # Session recording hook, a no-op unless a recorder is attached
+        if self.recorder is not None:
+            self.recorder.write(timestamp, face_rect, rois, self.last_stats if face_rect is not None else (), landmarks)
+    
+    def process_frame(self, frame, roi_manager, signal_processor, visualization, timestamp=None):
+        current_rois = []
+        current_time = timestamp if timestamp is not None else time.time()
+        governor = self.governor
+        if governor is not None and not governor.admit(current_time):
+            return self.skip_frame(frame)
+        
+        start = time.perf_counter()
+        frame, face_rects = self.detect_faces(frame)
+        if not face_rects:
+            self.record(current_time)
+        if governor is not None:
+            governor.observe('detect', time.perf_counter() - start)
+        
+        self.last_faces = []
+        for face_rect, landmarks in zip(face_rects, self.face_landmarks):
+            start = time.perf_counter()
+            current_rois, intensities = self.extract_signals(frame, face_rect, roi_manager, landmarks=landmarks)
+            self.record(current_time, face_rect, current_rois, landmarks)
+            self.last_faces.append((face_rect, current_rois))
+            motion = self.motion.update(landmarks, face_rect, current_time)
+            roi_done = time.perf_counter()
+            self.update_signals(signal_processor, visualization, current_rois, intensities, current_time, motion)
+            if governor is not None:
+                governor.observe('roi', roi_done - start)
+                governor.observe('dsp', time.perf_counter() - roi_done)
+        
+        if governor is not None:
+            governor.update(signal_processor, current_time)
+        return frame, current_rois
+    
+    def process_subjects(self, frame, roi_manager, subject_tracker, visualization, timestamp=None):
+        # Multi-face variant of process_frame: every tracked subject keeps its own
+        # SignalProcessor, and their heart rates are estimated in one batch
+        current_time = timestamp if timestamp is not None else time.time()
+        governor = self.governor
+        if governor is not None and not governor.admit(current_time):
+            return self.skip_frame(frame)
+        
+        start = time.perf_counter()
+        frame, face_rects = self.detect_faces(frame)
+        subjects = subject_tracker.associate(face_rects, current_time)
+        primary = subject_tracker.primary()
+        if governor is not None:
+            governor.observe('detect', time.perf_counter() - start)
+            start = time.perf_counter()
+        
+        current_rois = []
+        self.last_faces = []
+        for subject, face_rect, landmarks in zip(subjects, face_rects, self.face_landmarks):
+            rois, intensities = self.extract_signals(frame, face_rect, roi_manager, landmarks=landmarks)
+            self.last_faces.append((face_rect, rois))
+            motion = subject.motion.update(landmarks, face_rect, current_time)
+            subject_visualization = visualization if subject is primary else None
+            self.ingest_sample(subject.signal_processor, subject_visualization, rois, intensities, current_time, motion)
+            if subject is primary:
+                current_rois = rois
+        
+        # One estimate cadence for the whole batch
+        ready = [s for s in subjects if len(s.signal_processor.timestamps) > 45]
+        if governor is not None and ready and not governor.estimate_due(current_time):
+            ready = []
+        estimates = self.estimate_subjects([s.signal_processor for s in ready]) if ready else []
+        for subject, estimate in zip(ready, estimates):
+            subject_visualization = visualization if subject is primary else None
+            self.apply_estimate(subject.signal_processor, subject_visualization, estimate,
+                                subject.signal_processor.analysis_fs(), current_time, state=subject)
+        
+        if governor is not None:
+            governor.observe('dsp', time.perf_counter() - start)
+            if primary is not None:
+                governor.update(primary.signal_processor, current_time)
+        
+        for subject, (x, y, w, h) in zip(subjects, face_rects):
+            label = f"#{subject.id} {int(subject.signal_processor.current_bpm)} BPM"
+            draw_label(frame, label, x, x + w, y + h + 18, 0.5, (0, 255, 255))
         
         return frame, current_rois
     
@@ -1,7 +1,6 @@
 import cv2
 import numpy as np
 import time
-from scipy.signal import find_peaks
 from config import *
 
 class Visualization:
@@ -12,115 +11,117 @@ class Visualization:
             'freqs': [],
             'fft': []
         }
+        # Static layers are drawn once. Panels and graphs are redrawn over a copy
+        # of them every DISPLAY_REFRESH_INTERVAL seconds; in between only the
+        # camera image is pasted into the same canvas
+        self.backgrounds = {}
+        self.canvas = None
+        self.last_overlay_time = None
+    
+    def _graph_background(self, width, height, title, labels=()):
+        key = (width, height, title, labels)
+        if key not in self.backgrounds:
+            graph = np.zeros((height, width, 3), dtype=np.uint8)
+            graph[:, 0:width:50] = (50, 50, 50)
+            graph[0:height:50, :] = (50, 50, 50)
+            cv2.putText(graph, title, (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+            for text, position in labels:
+                cv2.putText(graph, text, position, cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 150, 150), 1)
+            self.backgrounds[key] = graph
+        return self.backgrounds[key].copy()
+    
+    def _display_background(self):
+        if 'display' not in self.backgrounds:
+            background = np.zeros((DISPLAY_HEIGHT, DISPLAY_WIDTH, 3), dtype=np.uint8)
+            panel_x, panel_y = 600, 50
+            cv2.rectangle(background, (panel_x, panel_y), (panel_x + 250, panel_y + 400), (40, 40, 40), -1)
+            cv2.rectangle(background, (panel_x, panel_y), (panel_x + 250, panel_y + 400), (100, 100, 100), 2)
+            cv2.putText(background, "ROI WEIGHTS & STATUS", (panel_x + 10, panel_y + 25),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+            cv2.putText(background, "Three-ROI Heart Rate Monitor - Press 'q' to quit", 
+                       (50, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+            self.backgrounds['display'] = background
+        return self.backgrounds['display']
     
     def create_signal_graph(self, signal, width, height, color=(0, 255, 0), title="PPG Signal"):
-        graph = np.zeros((height, width, 3), dtype=np.uint8)
-        
         if len(signal) < 2:
-            return graph
+            return np.zeros((height, width, 3), dtype=np.uint8)
+        graph = self._graph_background(width, height, title)
         
+        signal = np.asarray(signal, dtype=np.float64)
         signal_normalized = (signal - np.min(signal)) / (np.max(signal) - np.min(signal) + 1e-10)
         signal_normalized = signal_normalized * (height - 40) + 20
         
-        for i in range(0, width, 50):
-            cv2.line(graph, (i, 0), (i, height), (50, 50, 50), 1)
-        for i in range(0, height, 50):
-            cv2.line(graph, (0, i), (width, i), (50, 50, 50), 1)
-        
-        points = []
-        for i, value in enumerate(signal_normalized):
-            x = int(i * width / len(signal_normalized))
-            y = height - int(value)
-            points.append((x, y))
-        
-        for i in range(1, len(points)):
-            cv2.line(graph, points[i-1], points[i], color, 2)
-        
-        cv2.putText(graph, title, (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        points = np.empty((len(signal), 2), dtype=np.int32)
+        points[:, 0] = (np.arange(len(signal)) * width / len(signal)).astype(np.int32)
+        points[:, 1] = height - signal_normalized.astype(np.int32)
+        cv2.polylines(graph, [points.reshape(-1, 1, 2)], False, color, 2)
         
         if len(signal) > 30:
             try:
+                from scipy.signal import find_peaks
                 peaks, _ = find_peaks(signal, distance=len(signal)//8, prominence=np.std(signal)*0.3)
                 for peak in peaks:
-                    if peak < len(points):
-                        cv2.circle(graph, points[peak], 4, (0, 0, 255), -1)
+                    cv2.circle(graph, tuple(points[peak]), 4, (0, 0, 255), -1)
             except:
                 pass
         
         return graph
     
     def create_fft_graph(self, freqs, fft_values, width, height, current_bpm=0):
-        graph = np.zeros((height, width, 3), dtype=np.uint8)
-        
         if len(freqs) < 2 or len(fft_values) < 2:
-            return graph
+            return np.zeros((height, width, 3), dtype=np.uint8)
         
         hr_range = (freqs >= 0.5) & (freqs <= 4.0)
         hr_freqs = freqs[hr_range]
         hr_fft = fft_values[hr_range]
         
         if len(hr_freqs) < 2:
-            return graph
+            return np.zeros((height, width, 3), dtype=np.uint8)
+        graph = self._graph_background(width, height, "Frequency Spectrum",
+                                       (("0.5 Hz", (10, height - 10)), ("4.0 Hz", (width - 50, height - 10))))
         
         hr_fft_normalized = (hr_fft - np.min(hr_fft)) / (np.max(hr_fft) - np.min(hr_fft) + 1e-10)
         hr_fft_normalized = hr_fft_normalized * (height - 60) + 30
         
-        for i in range(0, width, 50):
-            cv2.line(graph, (i, 0), (i, height), (50, 50, 50), 1)
-        for i in range(0, height, 50):
-            cv2.line(graph, (0, i), (width, i), (50, 50, 50), 1)
+        points = np.empty((len(hr_freqs), 2), dtype=np.int32)
+        points[:, 0] = ((hr_freqs - 0.5) / 3.5 * width).astype(np.int32)
+        points[:, 1] = height - hr_fft_normalized.astype(np.int32)
+        cv2.polylines(graph, [points.reshape(-1, 1, 2)], False, (0, 200, 255), 2)
         
-        points = []
-        for i, (freq, value) in enumerate(zip(hr_freqs, hr_fft_normalized)):
-            x = int((freq - 0.5) / 3.5 * width)
-            y = height - int(value)
-            points.append((x, y))
-        
-        for i in range(1, len(points)):
-            cv2.line(graph, points[i-1], points[i], (0, 200, 255), 2)
-        
-        if len(hr_fft) > 0:
-            dominant_idx = np.argmax(hr_fft)
-            dominant_freq = hr_freqs[dominant_idx]
-            dominant_bpm = dominant_freq * 60
-            
-            if 0 <= dominant_idx < len(points):
-                cv2.circle(graph, points[dominant_idx], 6, (0, 255, 255), -1)
-                cv2.putText(graph, f"{dominant_bpm:.0f} BPM", 
-                           (points[dominant_idx][0] + 10, points[dominant_idx][1] - 10),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 255), 1)
-        
-        cv2.putText(graph, "Frequency Spectrum", (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        cv2.putText(graph, "0.5 Hz", (10, height-10), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 150, 150), 1)
-        cv2.putText(graph, "4.0 Hz", (width-50, height-10), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (150, 150, 150), 1)
+        dominant_idx = np.argmax(hr_fft)
+        dominant_bpm = hr_freqs[dominant_idx] * 60
+        x, y = points[dominant_idx]
+        cv2.circle(graph, (int(x), int(y)), 6, (0, 255, 255), -1)
+        cv2.putText(graph, f"{dominant_bpm:.0f} BPM", (int(x) + 10, int(y) - 10),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 255), 1)
         
         return graph
     
     def create_display_frame(self, camera_frame, signal_processor, current_rois, video_processor):
-        display_frame = np.zeros((DISPLAY_HEIGHT, DISPLAY_WIDTH, 3), dtype=np.uint8)
+        # The returned frame is reused by the next call
+        now = time.time()
+        if self.canvas is None or now - self.last_overlay_time >= DISPLAY_REFRESH_INTERVAL:
+            self.canvas = self._display_background().copy()
+            self._create_control_panel(self.canvas, signal_processor, current_rois, video_processor)
+            self._create_signal_graphs(self.canvas, signal_processor.current_bpm)
+            self.last_overlay_time = now
         
         camera_display = cv2.resize(camera_frame, (500, 400))
-        display_frame[50:450, 50:550] = camera_display
+        if MIRROR_MODE == 'display':
+            camera_display = cv2.flip(camera_display, 1)
+        self.canvas[50:450, 50:550] = camera_display
+        self._add_instructions(self.canvas)
         
-        self._create_control_panel(display_frame, signal_processor, current_rois, video_processor)
-        self._create_signal_graphs(display_frame, signal_processor.current_bpm)
-        self._add_instructions(display_frame)
-        
-        return display_frame
+        return self.canvas
     
     def _create_control_panel(self, display_frame, signal_processor, current_rois, video_processor):
         panel_x, panel_y = 600, 50
         
-        cv2.rectangle(display_frame, (panel_x, panel_y), (panel_x + 250, panel_y + 400), (40, 40, 40), -1)
-        cv2.rectangle(display_frame, (panel_x, panel_y), (panel_x + 250, panel_y + 400), (100, 100, 100), 2)
-        
-        cv2.putText(display_frame, "ROI WEIGHTS & STATUS", (panel_x + 10, panel_y + 25),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-        
         if current_rois and len(current_rois) > 0 and len(signal_processor.timestamps) > 10:
             weight_y = panel_y + 60
             for i, roi_info in enumerate(current_rois):
-                if i in signal_processor.roi_weights:
+                if i < len(signal_processor.roi_weights):
                     weight = signal_processor.roi_weights[i] * 100
                     color = roi_info['color']
                     
@@ -178,14 +179,14 @@ class Visualization:
                                                    color=(0, 200, 255), title="Filtered PPG Signal")
             display_frame[graph_y:graph_y+GRAPH_HEIGHT, 50+GRAPH_WIDTH+50:50+GRAPH_WIDTH+50+GRAPH_WIDTH] = filtered_graph
         
-        if len(self.graph_signals['freqs']) > 0 and len(self.graph_signals['fft']) > 0:
-            fft_graph = self.create_fft_graph(self.graph_signals['freqs'], self.graph_signals['fft'], 
-                                           GRAPH_WIDTH, GRAPH_HEIGHT, current_bpm)
-            if graph_y + GRAPH_HEIGHT * 2 + 20 < DISPLAY_HEIGHT:
+        # Only drawn when the layout leaves room below the first row
+        if graph_y + GRAPH_HEIGHT * 2 + 20 < DISPLAY_HEIGHT:
+            if len(self.graph_signals['freqs']) > 0 and len(self.graph_signals['fft']) > 0:
+                fft_graph = self.create_fft_graph(self.graph_signals['freqs'], self.graph_signals['fft'], 
+                                               GRAPH_WIDTH, GRAPH_HEIGHT, current_bpm)
                 display_frame[graph_y+GRAPH_HEIGHT+20:graph_y+GRAPH_HEIGHT*2+20, 50:50+GRAPH_WIDTH] = fft_graph
     
     def _add_instructions(self, display_frame):
-        cv2.putText(display_frame, "Three-ROI Heart Rate Monitor - Press 'q' to quit", 
-                   (50, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+        # The title is part of the static background; this caption overlaps the camera image
         cv2.putText(display_frame, "Green: Forehead | Blue: Cheeks", 
                    (50, 450), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
\ No newline at end of file